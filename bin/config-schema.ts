@@ -141,6 +141,43 @@ const configSchema = {
                     description:
                         'Threshold for similarity score to include a document in the corpus',
                 },
+                concurrentPreprocessing: {
+                    type: 'boolean',
+                    description:
+                        'Whether to run the standalone question rewrite concurrently with the classification step',
+                },
+                speculativeRetrieval: {
+                    type: 'boolean',
+                    description:
+                        'Whether to search the corpus with the raw question while the classification step runs',
+                },
+                answerCacheConfig: {
+                    type: 'object',
+                    description: 'Configuration for the semantic answer cache',
+                    properties: {
+                        enabled: {
+                            type: 'boolean',
+                            description: 'Whether to answer questions similar to previous ones from the cache',
+                        },
+                        backend: {
+                            type: 'string',
+                            enum: ['pgvector', 'memory'],
+                            description: 'Where cached answers are stored',
+                        },
+                        similarityThreshold: {
+                            type: 'number',
+                            description: 'Minimum similarity between two standalone questions to reuse an answer',
+                        },
+                        ttlSeconds: {
+                            type: 'number',
+                            description: 'Number of seconds a cached answer can be reused',
+                        },
+                        maxEntries: {
+                            type: 'number',
+                            description: 'Maximum number of answers kept per corpus by the memory backend',
+                        },
+                    },
+                },
                 qaChainConfig: {
                     $ref: '#/definitions/LLMChainConfig',
                     description: 'Configuration for the question-answering chain',
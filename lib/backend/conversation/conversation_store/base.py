@@ -75,6 +75,21 @@ class BaseChatHistoryStore(ABC):
     ) -> ChatMessage:
         raise NotImplementedError("This method should be implemented by subclasses.")
 
+    @abstractmethod
+    def append_turn(
+        self,
+        user_id: str,
+        chat_id: str,
+        question: str,
+        answer: str,
+        input_tokens: int,
+        output_tokens: int,
+        model_id: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[ChatMessage, ChatMessage]:
+        """Store the user message, the assistant message with its sources, and the cost of the turn at once."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
     @abstractmethod
     def delete_chat_message(self, user_id: str, message_id: str) -> None:
         raise NotImplementedError("This method should be implemented by subclasses.")
@@ -87,9 +102,18 @@ class BaseChatHistoryStore(ABC):
 
     # NOTE: to reviewer: Added this to test the Dynamo backend
     @abstractmethod
-    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Chat:
+    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Dict[str, Any]:
+        """Add the tokens of a message to the chat counters and return the updated counters."""
         raise NotImplementedError("This method should be implemented by subclasses.")
 
+    def add_cost(self, user_id: str, chat_id: str, input_tokens: int, output_tokens: int, model_id: str) -> Dict[str, Any]:
+        """Add the input and output tokens of a model call to the chat counters.
+
+        Stores that can update both counters at once should override this method.
+        """
+        self.update_cost(user_id, chat_id, tokens=input_tokens, model_id=model_id, message_type="user")
+        return self.update_cost(user_id, chat_id, tokens=output_tokens, model_id=model_id, message_type="assistant")
+
     @abstractmethod
     def list_chat_messages(
         self, user_id: str, chat_id: str, next_token: Optional[str] = None, limit: int = 50, ascending: bool = True
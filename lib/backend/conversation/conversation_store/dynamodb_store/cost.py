@@ -1,24 +1,55 @@
 import json
-import boto3
 import decimal
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+
 from aws_lambda_powertools import Logger
 
+if TYPE_CHECKING:
+    import numpy as np
+
+from .utils import get_all_by_pagination, get_chat_messages_by_time_key
+
 logger = Logger()
 
-def get_messages_by_chat_id(table_name, chat_id, region):
-    dynamodb = boto3.resource('dynamodb', region_name=region)
-    table = dynamodb.Table(table_name)
+CONVERSATION_INDEX_NAME = os.getenv("CONVERSATION_INDEX_NAME", "")
+
+# Number of chats whose messages are queried in parallel by get_cost_per_chats
+MAX_CHAT_QUERY_WORKERS = 8
+
 
-    response = table.scan(
-        FilterExpression="chatId = :chat_id AND entity = :message",
-        ExpressionAttributeValues={
-            ":chat_id": chat_id,
-            ":message": "MESSAGE"
+def get_message_tokens_by_chat_id(user_id, chat_id, table_name, index_name=CONVERSATION_INDEX_NAME):
+    """Sum the tokens of the human and AI messages of a chat.
+
+    Messages are read from the chat's partition of the time index, projecting only the
+    attributes needed to cost them, and every page of the query is consumed.
+    """
+    keys = get_chat_messages_by_time_key(user_id, chat_id)
+    messages = get_all_by_pagination(
+        {
+            "TableName": table_name,
+            "IndexName": index_name,
+            "KeyConditionExpression": "GSI1PK = :PK",
+            "ExpressionAttributeValues": {":PK": {"S": keys["GSI1PK"]}},
+            "ProjectionExpression": "#messageType, #tokens",
+            "ExpressionAttributeNames": {"#messageType": "messageType", "#tokens": "tokens"},
         }
     )
 
-    return response.get("Items", [])
+    input_tokens = output_tokens = 0
+    for message in messages:
+        if message.get("messageType") == "human":
+            input_tokens += int(message.get("tokens") or 0)
+        elif message.get("messageType") == "ai":
+            output_tokens += int(message.get("tokens") or 0)
+
+    return input_tokens, output_tokens
 
 def convert_decimals(obj):
     if isinstance(obj, list):
@@ -31,42 +62,132 @@ def convert_decimals(obj):
         return obj
 
 
-def strip_us_prefix(model_id: str) -> str:
-    return model_id[3:] if model_id.startswith("us.") else model_id
+INFERENCE_PROFILE_PREFIXES = ("us.", "eu.", "apac.")
+
+MODEL_COSTS_FILE = Path(__file__).parent / "model_costs.json"
+
+# How often the price file is checked for changes, in seconds
+MTIME_CHECK_INTERVAL = 5.0
+
+
+def normalize_model_id(model_id: str) -> str:
+    """Map a cross-region inference profile ID (e.g. `eu.anthropic...`) to the ID of its model."""
+    for prefix in INFERENCE_PROFILE_PREFIXES:
+        if model_id.startswith(prefix):
+            return model_id[len(prefix):]
+    return model_id
+
+
+class PriceIndex:
+    """Immutable per-token prices of the models, indexed by model ID.
+
+    Prices are also available as a matrix with one (input_cost, output_cost) row per model, plus a
+    last row of zeros for unknown models, so token counts can be costed in bulk. The matrix is built on
+    first use, so looking up the prices of a model does not import NumPy.
+    """
+
+    def __init__(self, prices: Dict[str, Tuple[float, float]], mtime_ns: int) -> None:
+        self.mtime_ns = mtime_ns
+        self._prices = MappingProxyType(dict(prices))
+        self._rows = MappingProxyType({model_id: row for row, model_id in enumerate(prices)})
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    @cached_property
+    def price_matrix(self) -> "np.ndarray":
+        import numpy as np
+
+        price_matrix = np.array([*self._prices.values(), (0.0, 0.0)], dtype=np.float64).reshape(-1, 2)
+        price_matrix.flags.writeable = False
+        return price_matrix
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PriceIndex":
+        mtime_ns = path.stat().st_mtime_ns
+        with open(path, "r") as file:
+            cost_per_token = json.load(file)
+        # Cost format is (input_cost, output_cost)
+        return cls({key: (float(value[0]), float(value[1])) for key, value in cost_per_token.items()}, mtime_ns)
+
+    def get(self, model_id: str) -> Optional[Tuple[float, float]]:
+        return self._prices.get(normalize_model_id(model_id))
+
+    def row(self, model_id: str) -> int:
+        return self._rows.get(normalize_model_id(model_id), len(self._rows))
+
+
+_price_index: Optional[PriceIndex] = None
+_price_index_checked_at = 0.0
+_price_index_lock = threading.Lock()
+
+
+def get_price_index() -> PriceIndex:
+    """Return the price index, rebuilding it when `model_costs.json` changed on disk."""
+    global _price_index, _price_index_checked_at
+
+    now = time.monotonic()
+    if _price_index is not None and now - _price_index_checked_at < MTIME_CHECK_INTERVAL:
+        return _price_index
+
+    with _price_index_lock:
+        if _price_index is None or MODEL_COSTS_FILE.stat().st_mtime_ns != _price_index.mtime_ns:
+            _price_index = PriceIndex.from_file(MODEL_COSTS_FILE)
+            logger.debug(f"Loaded prices of {len(_price_index)} models")
+        _price_index_checked_at = now
+    return _price_index
+
 
 def get_model_costs(model_id):
-    base_directory = Path(__file__).parent
-    json_file_path = base_directory / "model_costs.json"
+    prices = get_price_index().get(model_id)
+    if prices is None:
+        logger.error("Invalid model identifier", extra={"model_id": model_id})
+        return 0, 0
+    return prices
 
-    with open(json_file_path, "r") as file:
-        json_data = file.read()
 
-    cost_per_token = json.loads(json_data)
-    # Cost format is (input_cost, output_cost)
-    cost_per_token = {key: tuple(value) for key, value in cost_per_token.items()}
+def compute_costs(usages: Sequence[Tuple[str, int, int]]) -> "np.ndarray":
+    """Cost many (model_id, input_tokens, output_tokens) tuples at once.
 
-    model_id = strip_us_prefix(model_id)
-    if model_id in cost_per_token:
-        input_cost, output_cost = cost_per_token[model_id]
-    else:
-        input_cost = output_cost = 0
-        logger.error("Invalid model identifier")
+    Returns:
+    -------
+        np.ndarray: One (input_cost, output_cost, total_cost) row per tuple. Unknown models cost 0.
+    """
+    import numpy as np
 
-    return input_cost, output_cost
+    index = get_price_index()
+    if not usages:
+        return np.zeros((0, 3), dtype=np.float64)
 
-def get_cost_per_chat(chat_id, model_id, conversation_table_name, region):
-    messages = get_messages_by_chat_id(conversation_table_name, chat_id, region)
-    messages = convert_decimals(messages)
+    rows = np.fromiter((index.row(model_id) for model_id, _, _ in usages), dtype=np.intp, count=len(usages))
+    tokens = np.array([(input_tokens, output_tokens) for _, input_tokens, output_tokens in usages], dtype=np.float64)
 
-    input_tokens = output_tokens = 0
-    for message in messages:
-        if message["messageType"] == "human":
-            input_tokens += int(message['tokens'])
-        elif message["messageType"] == "ai":
-            output_tokens += int(message['tokens'])
+    costs = tokens * index.price_matrix[rows]
+    return np.column_stack((costs, costs.sum(axis=1)))
+
+def get_cost_per_chat(user_id, chat_id, model_id, conversation_table_name, index_name=CONVERSATION_INDEX_NAME):
+    return get_cost_per_chats(user_id, [chat_id], model_id, conversation_table_name, index_name)[chat_id]
+
+
+def get_cost_per_chats(user_id, chat_ids, model_id, conversation_table_name, index_name=CONVERSATION_INDEX_NAME):
+    """Compute the total cost of several chats of a user in one pass.
+
+    Returns:
+    -------
+        dict: The total cost of each chat, by chat ID.
+    """
+    chat_ids = list(dict.fromkeys(chat_ids))
+    if not chat_ids:
+        return {}
 
-    input_cost, output_cost = get_model_costs(model_id)
+    with ThreadPoolExecutor(max_workers=min(MAX_CHAT_QUERY_WORKERS, len(chat_ids))) as executor:
+        tokens = list(
+            executor.map(
+                lambda chat_id: get_message_tokens_by_chat_id(user_id, chat_id, conversation_table_name, index_name),
+                chat_ids,
+            )
+        )
 
-    total_cost = (input_cost * input_tokens) + (output_cost * output_tokens)
+    costs = compute_costs([(model_id, input_tokens, output_tokens) for input_tokens, output_tokens in tokens])
 
-    return total_cost
\ No newline at end of file
+    return {chat_id: float(total_cost) for chat_id, total_cost in zip(chat_ids, costs[:, 2])}
@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: Apache-2.0
 from typing import Any, Dict, List, Optional, Tuple, Literal
 
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
 from francis_toolkit.utils import get_timestamp
 
 from ..base import BaseChatHistoryStore, Chat, ChatMessage, ChatMessageSource
@@ -20,6 +22,29 @@ from .utils import (
 from .cost import get_model_costs
 from decimal import Decimal
 
+logger = Logger()
+
+# Maximum number of actions in a single DynamoDB TransactWriteItems request
+MAX_TRANSACT_ITEMS = 100
+
+ZERO_TOKENS = {"input_tokens": Decimal("0"), "output_tokens": Decimal("0")}
+ZERO_COST = {"user_cost": Decimal("0"), "assistant_cost": Decimal("0"), "total_cost": Decimal("0")}
+
+
+def _is_validation_error(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") == "ValidationException"
+
+
+def _cancellation_reason(error: ClientError, index: int) -> Optional[str]:
+    """Return the code of the action at `index` that cancelled a transaction, None if it did not cancel it."""
+    if error.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+        return None
+    reasons = error.response.get("CancellationReasons") or []
+    if index >= len(reasons):
+        return None
+    code = reasons[index].get("Code")
+    return code if code and code != "None" else None
+
 
 class DynamoDBChatHistoryStore(BaseChatHistoryStore):
     def __init__(
@@ -153,49 +178,38 @@ class DynamoDBChatHistoryStore(BaseChatHistoryStore):
             userId=user_id,
         )
 
-    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Chat:
-        response = self.table.get_item(Key=get_chat_key(user_id, chat_id))
-        record = response.get("Item", {})
-        tokens_data = record.get("tokens", {"input_tokens": Decimal('0'), "output_tokens": Decimal('0')})
-        cost_data = record.get("cost", {"user_cost": Decimal('0'), "assistant_cost": Decimal('0'), "total_cost": Decimal('0')})
-
-        input_token_cost, output_token_cost = map(Decimal, get_model_costs(model_id))
-        tokens = Decimal(tokens)
-
+    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Dict[str, Any]:
+        if message_type == "user":
+            return self.add_cost(user_id, chat_id, input_tokens=tokens, output_tokens=0, model_id=model_id)
         if message_type == "assistant":
-            tokens_data["output_tokens"] += tokens
-            cost_data["assistant_cost"] += tokens * output_token_cost
-        elif message_type == "user":
-            tokens_data["input_tokens"] += tokens
-            cost_data["user_cost"] += tokens * input_token_cost
-
-        # Recalculate total cost
-        cost_data["total_cost"] = cost_data["user_cost"] + cost_data["assistant_cost"]
-
-        # Update the record in DynamoDB
-        update_response = self.table.update_item(
+            return self.add_cost(user_id, chat_id, input_tokens=0, output_tokens=tokens, model_id=model_id)
+        return self.add_cost(user_id, chat_id, input_tokens=0, output_tokens=0, model_id=model_id)
+
+    def add_cost(self, user_id: str, chat_id: str, input_tokens: int, output_tokens: int, model_id: str) -> Dict[str, Any]:
+        # ADD updates the counters server side, so concurrent turns on the same chat cannot overwrite each other
+        cost_update = self._cost_update_params(user_id, chat_id, input_tokens, output_tokens, model_id)
+        try:
+            response = self.table.update_item(**cost_update, ReturnValues="UPDATED_NEW")
+        except ClientError as e:
+            if not _is_validation_error(e):
+                raise
+            self._initialize_cost_maps(user_id, chat_id)
+            response = self.table.update_item(**cost_update, ReturnValues="UPDATED_NEW")
+        return response["Attributes"]
+
+    def _initialize_cost_maps(self, user_id: str, chat_id: str) -> None:
+        """Create the `tokens` and `cost` maps of a chat that has none, so that ADD can update their counters.
+
+        Chats created before token accounting, or written partially, lack them and ADD fails on a nested
+        path whose parent map does not exist.
+        """
+        self.table.update_item(
             Key=get_chat_key(user_id, chat_id),
             ConditionExpression="attribute_exists(PK) and attribute_exists(SK)",
-            UpdateExpression="set tokens = :tokens, cost = :cost, updatedAt = :updatedAt",
-            ExpressionAttributeValues={
-                ":tokens": tokens_data,
-                ":cost": cost_data,
-                ":updatedAt": get_timestamp(),
-            },
-            ReturnValues="ALL_NEW",
+            UpdateExpression="SET #tokens = if_not_exists(#tokens, :zero_tokens), #cost = if_not_exists(#cost, :zero_cost)",
+            ExpressionAttributeNames={"#tokens": "tokens", "#cost": "cost"},
+            ExpressionAttributeValues={":zero_tokens": ZERO_TOKENS, ":zero_cost": ZERO_COST},
         )
-        updated_record = update_response["Attributes"]
-
-        return Chat(
-            chatId=chat_id,
-            title=record["title"],
-            tokens=updated_record["tokens"],
-            cost=updated_record["cost"],
-            createdAt=int(updated_record["createdAt"]),
-            updatedAt=int(updated_record["updatedAt"]),
-            userId=user_id,
-        )
-
 
     def list_chats(self, user_id: str) -> List[Chat]:
         keys = get_chats_by_time_key(user_id, "")
@@ -318,18 +332,15 @@ class DynamoDBChatHistoryStore(BaseChatHistoryStore):
 
         bulk_delete_items(self.table_name, keys_to_delete)
 
-    def create_chat_message(
-        self, user_id: str, chat_id: str, message_type: str, content: str, tokens: int, sources: List[Dict[str, Any]] | None = None
-    ) -> ChatMessage:
-        new_chat_message_id = get_next_object_id()
-
-        timestamp = get_timestamp()
-        keys = get_chat_message_key(user_id, new_chat_message_id)
+    def _chat_message_item(
+        self, user_id: str, chat_id: str, message_id: str, message_type: str, content: str, tokens: int, timestamp: int
+    ) -> Dict[str, Any]:
+        keys = get_chat_message_key(user_id, message_id)
         gsi_keys = get_chat_messages_by_time_key(user_id, chat_id, str(timestamp))
 
-        chat_message = {
+        return {
             "chatId": chat_id,
-            "messageId": new_chat_message_id,
+            "messageId": message_id,
             "createdAt": timestamp,
             "userId": user_id,
             "messageType": message_type,
@@ -342,6 +353,90 @@ class DynamoDBChatHistoryStore(BaseChatHistoryStore):
             "tokens": tokens
         }
 
+    def _message_source_items(
+        self, user_id: str, chat_id: str, message_id: str, sources: List[Dict[str, Any]], timestamp: int
+    ) -> List[Dict[str, Any]]:
+        items = []
+        for idx, source in enumerate(sources):
+            source_id = str(idx)
+            source_keys = get_message_source_key(user_id, message_id, source_id)
+            items.append(
+                {
+                    **source_keys,
+                    "sourceId": source_id,
+                    "userId": user_id,
+                    "chatId": chat_id,
+                    "messageId": message_id,
+                    "createdAt": timestamp,
+                    "entity": "SOURCE",
+                    "pageContent": source["pageContent"],
+                    "metadata": {key: str(value) for key, value in source["metadata"].items()},
+                }
+            )
+        return items
+
+    def _cost_update_params(self, user_id: str, chat_id: str, input_tokens: int, output_tokens: int, model_id: str) -> Dict[str, Any]:
+        """Build update_item parameters that add the token and cost deltas of a model call to the chat counters."""
+        input_token_cost, output_token_cost = map(Decimal, get_model_costs(model_id))
+        user_cost = Decimal(input_tokens) * input_token_cost
+        assistant_cost = Decimal(output_tokens) * output_token_cost
+
+        return {
+            "Key": get_chat_key(user_id, chat_id),
+            "ConditionExpression": "attribute_exists(PK) and attribute_exists(SK)",
+            "UpdateExpression": (
+                "ADD #tokens.input_tokens :input_tokens, #tokens.output_tokens :output_tokens, "
+                "#cost.user_cost :user_cost, #cost.assistant_cost :assistant_cost, #cost.total_cost :total_cost "
+                "SET updatedAt = :updatedAt"
+            ),
+            "ExpressionAttributeNames": {"#tokens": "tokens", "#cost": "cost"},
+            "ExpressionAttributeValues": {
+                ":input_tokens": Decimal(input_tokens),
+                ":output_tokens": Decimal(output_tokens),
+                ":user_cost": user_cost,
+                ":assistant_cost": assistant_cost,
+                ":total_cost": user_cost + assistant_cost,
+                ":updatedAt": get_timestamp(),
+            },
+        }
+
+    def _write_turn(self, transact_items: List[Dict[str, Any]], cost_update_index: int, user_id: str, chat_id: str) -> None:
+        """Write the items of a turn in one transaction.
+
+        A failing cost update must not lose the messages. When it cancels the transaction because the chat has no
+        `tokens` or `cost` map, the maps are created and the transaction is retried. On any other failure of the
+        cost update, the messages are written without it.
+        """
+        # The client of the resource accepts native Python types, like the Table resource does
+        client = self.dynamodb_resource_client.meta.client
+        for attempt in range(2):
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+                return
+            except ClientError as e:
+                reason = _cancellation_reason(e, cost_update_index)
+                if reason is None:
+                    raise
+                error: ClientError = e
+                if reason != "ValidationError" or attempt > 0:
+                    break
+                try:
+                    self._initialize_cost_maps(user_id, chat_id)
+                except ClientError as init_error:
+                    error = init_error
+                    break
+
+        logger.warning(f"Failed to update the cost of chat {chat_id}, storing the turn without it: {error}")
+        client.transact_write_items(TransactItems=[item for i, item in enumerate(transact_items) if i != cost_update_index])
+
+    def create_chat_message(
+        self, user_id: str, chat_id: str, message_type: str, content: str, tokens: int, sources: List[Dict[str, Any]] | None = None
+    ) -> ChatMessage:
+        new_chat_message_id = get_next_object_id()
+
+        timestamp = get_timestamp()
+        chat_message = self._chat_message_item(user_id, chat_id, new_chat_message_id, message_type, content, tokens, timestamp)
+
         self.table.put_item(
             Item=chat_message,
             ReturnValues="NONE",
@@ -350,20 +445,7 @@ class DynamoDBChatHistoryStore(BaseChatHistoryStore):
         chat_message_sources = []
         if sources:
             with self.table.batch_writer() as batch:
-                for idx, source in enumerate(sources):
-                    source_id = str(idx)
-                    source_keys = get_message_source_key(user_id, new_chat_message_id, source_id)
-                    message_source = {
-                        **source_keys,
-                        "sourceId": source_id,
-                        "userId": user_id,
-                        "chatId": chat_id,
-                        "messageId": new_chat_message_id,
-                        "createdAt": timestamp,
-                        "entity": "SOURCE",
-                        "pageContent": source["pageContent"],
-                        "metadata": {key: str(value) for key, value in source["metadata"].items()},
-                    }
+                for message_source in self._message_source_items(user_id, chat_id, new_chat_message_id, sources, timestamp):
                     batch.put_item(Item=message_source)
                     chat_message_sources.append(ChatMessageSource(**message_source))
 
@@ -376,3 +458,64 @@ class DynamoDBChatHistoryStore(BaseChatHistoryStore):
             messageType=message_type,
             sources=chat_message_sources,
         )
+
+    def append_turn(
+        self,
+        user_id: str,
+        chat_id: str,
+        question: str,
+        answer: str,
+        input_tokens: int,
+        output_tokens: int,
+        model_id: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[ChatMessage, ChatMessage]:
+        human_message_id = get_next_object_id()
+        ai_message_id = get_next_object_id()
+
+        # The AI message is stamped 1ms later so the pair keeps its order on the time-sorted index
+        timestamp = get_timestamp()
+        human_message = self._chat_message_item(user_id, chat_id, human_message_id, "human", question, input_tokens, timestamp)
+        ai_message = self._chat_message_item(user_id, chat_id, ai_message_id, "ai", answer, output_tokens, timestamp + 1)
+        source_items = self._message_source_items(user_id, chat_id, ai_message_id, sources or [], timestamp + 1)
+
+        cost_update = self._cost_update_params(user_id, chat_id, input_tokens, output_tokens, model_id)
+        cost_update_index = 2
+        transact_items: List[Dict[str, Any]] = [
+            {"Put": {"TableName": self.table_name, "Item": human_message}},
+            {"Put": {"TableName": self.table_name, "Item": ai_message}},
+            {"Update": {"TableName": self.table_name, **cost_update}},
+        ]
+
+        # Sources that do not fit in the transaction are written in batches right after it
+        transaction_sources = source_items[: MAX_TRANSACT_ITEMS - len(transact_items)]
+        overflow_sources = source_items[len(transaction_sources) :]
+        transact_items.extend({"Put": {"TableName": self.table_name, "Item": item}} for item in transaction_sources)
+
+        self._write_turn(transact_items, cost_update_index, user_id, chat_id)
+
+        if overflow_sources:
+            with self.table.batch_writer() as batch:
+                for item in overflow_sources:
+                    batch.put_item(Item=item)
+
+        return (
+            ChatMessage(
+                chatId=chat_id,
+                userId=user_id,
+                messageId=human_message_id,
+                content=question,
+                createdAt=timestamp,
+                messageType="human",
+                sources=[],
+            ),
+            ChatMessage(
+                chatId=chat_id,
+                userId=user_id,
+                messageId=ai_message_id,
+                content=answer,
+                createdAt=timestamp + 1,
+                messageType="ai",
+                sources=[ChatMessageSource(**item) for item in source_items],
+            ),
+        )
@@ -184,6 +184,44 @@ class PostgresChatHistoryStore(BaseChatHistoryStore):
             chats = session.query(ChatEntity).filter_by(user_id=user_id).order_by(desc(ChatEntity.created_at)).all()
             return [self._entity_to_chat(chat) for chat in chats]
 
+    def _add_message(
+        self,
+        session: Any,
+        user_id: str,
+        chat_id: str,
+        message_type: str,
+        content: str,
+        tokens: int,
+        created_at: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> ChatMessage:
+        message_entity = MessageEntity(
+            id=str(uuid.uuid4()),
+            message_type=message_type,
+            user_id=user_id,
+            chat_id=chat_id,
+            content=content,
+            tokens=tokens,
+            created_at=created_at,
+        )
+        session.add(message_entity)
+
+        message_sources = []
+        for source in sources or []:
+            source = SourceEntity(
+                id=str(uuid.uuid4()),
+                message_id=message_entity.id,
+                page_content=source.get("pageContent"),
+                cmetadata=source.get("metadata"),
+                created_at=created_at,
+            )
+            message_sources.append(self._entity_to_source(source))
+            session.add(source)
+
+        message = self._entity_to_message(message_entity)
+        message.sources = message_sources
+        return message
+
     def create_chat_message(
         self,
         user_id: str,
@@ -195,34 +233,34 @@ class PostgresChatHistoryStore(BaseChatHistoryStore):
     ) -> ChatMessage:
         now = str(get_timestamp())
         with self._session_maker() as session:
-            message_entity = MessageEntity(
-                id=str(uuid.uuid4()),
-                message_type=message_type,
-                user_id=user_id,
-                chat_id=chat_id,
-                content=content,
-                tokens=tokens,
-                created_at=now,
-            )
-            session.add(message_entity)
-
-            message_sources = []
-            for source in sources or []:
-                source = SourceEntity(
-                    id=str(uuid.uuid4()),
-                    message_id=message_entity.id,
-                    page_content=source.get("pageContent"),
-                    cmetadata=source.get("metadata"),
-                    created_at=now,
-                )
-                message_sources.append(self._entity_to_source(source))
-                session.add(source)
+            message = self._add_message(session, user_id, chat_id, message_type, content, tokens, now, sources)
+            session.commit()
+            return message
 
+    def append_turn(
+        self,
+        user_id: str,
+        chat_id: str,
+        question: str,
+        answer: str,
+        input_tokens: int,
+        output_tokens: int,
+        model_id: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[ChatMessage, ChatMessage]:
+        timestamp = get_timestamp()
+        with self._session_maker() as session:
+            chat = session.query(ChatEntity).filter_by(user_id=user_id, id=chat_id).first()
+            if not chat:
+                raise ValueError("Chat not found")
+
+            # The AI message is stamped 1ms later so the pair keeps its order when sorted by creation time
+            human_message = self._add_message(session, user_id, chat_id, "human", question, input_tokens, str(timestamp))
+            ai_message = self._add_message(session, user_id, chat_id, "ai", answer, output_tokens, str(timestamp + 1), sources)
+            chat.updated_at = str(timestamp)
             session.commit()
 
-            message = self._entity_to_message(message_entity)
-            message.sources = message_sources
-            return message
+            return human_message, ai_message
 
     def delete_chat_message(self, user_id: str, message_id: str) -> None:
         with self._session_maker() as session:
@@ -276,14 +314,14 @@ class PostgresChatHistoryStore(BaseChatHistoryStore):
     # store to not explode.
     # Note that update_chat was implemented on the DynamoChatHistoryStore, but not on this class nor th
     # base class.
-    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Chat:
+    def update_cost(self, user_id: str, chat_id: str, tokens: int, model_id: str, message_type: str) -> Dict[str, Any]:
         with self._session_maker() as session:
             chat = session.query(ChatEntity).filter_by(user_id=user_id, id=chat_id).first()
             if not chat:
                 raise ValueError("Chat not found")
             chat.updated_at = get_timestamp()
             session.commit()
-            return self._entity_to_chat(chat)
+            return {"updatedAt": int(chat.updated_at)}
 
     def list_chat_messages(
         self,
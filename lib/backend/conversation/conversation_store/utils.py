@@ -2,29 +2,39 @@
 # SPDX-License-Identifier: Apache-2.0
 import os
 
-from francis_toolkit.clients import dynamodb_resource_client
-from francis_toolkit.utils import get_rds_connection_string, load_config_from_dynamodb
+from francis_toolkit.clients import get_resource
+from francis_toolkit.database import get_engine
+from francis_toolkit.config import SystemConfig, get_config_cache
 
 from .base import BaseChatHistoryStore
 from .dynamodb_store import DynamoDBChatHistoryStore
 from .postgres_store import PostgresChatHistoryStore
 
 _chat_history_store: BaseChatHistoryStore | None = None
+_chat_history_store_type: str | None = None
 
 
-def get_chat_history_store() -> BaseChatHistoryStore:
+def _on_config_change(system_config: SystemConfig) -> None:
     global _chat_history_store
-    if _chat_history_store is None:
-        system_config = load_config_from_dynamodb(os.getenv("CONFIG_TABLE_NAME"), "system_configuration")
+    if _chat_history_store is not None and system_config.chat_history_store_type != _chat_history_store_type:
+        _chat_history_store = None
+
+
+get_config_cache().subscribe(_on_config_change)
 
+
+def get_chat_history_store() -> BaseChatHistoryStore:
+    global _chat_history_store, _chat_history_store_type
+    system_config = get_config_cache().get()
+    if _chat_history_store is None:
         table_name = os.getenv("CONVERSATION_TABLE_NAME", "")
         index_name = os.getenv("CONVERSATION_INDEX_NAME", "")
 
-        chat_history_config = system_config.get("chatHistoryConfig", {})
-        if chat_history_config.get("storeType") == "aurora_postgres":
-            _chat_history_store = PostgresChatHistoryStore(connection=get_rds_connection_string())
+        _chat_history_store_type = system_config.chat_history_store_type
+        if _chat_history_store_type == "aurora_postgres":
+            _chat_history_store = PostgresChatHistoryStore(connection=get_engine())
         else:
-            _chat_history_store = DynamoDBChatHistoryStore(dynamodb_resource_client, table_name=table_name, index_name=index_name)
+            _chat_history_store = DynamoDBChatHistoryStore(get_resource("dynamodb"), table_name=table_name, index_name=index_name)
     return _chat_history_store
 
 
@@ -35,21 +45,10 @@ def update_cost(
     output_tokens: int,
     model_id: str,
 ) -> None:
-    chat_history_store = get_chat_history_store()
-
-    # TODO: update_cost should take human/ai as message type, not user/assistant
-    chat_history_store.update_cost(
-        user_id=user_id,
-        chat_id=chat_id,
-        tokens=input_tokens,
-        model_id=model_id,
-        message_type="user",
-    )
-
-    chat_history_store.update_cost(
+    get_chat_history_store().add_cost(
         user_id=user_id,
         chat_id=chat_id,
-        tokens=output_tokens,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
         model_id=model_id,
-        message_type="assistant",
     )
@@ -9,7 +9,9 @@ from aws_lambda_powertools.utilities.data_classes import (
     APIGatewayProxyEvent,
 )
 from aws_lambda_powertools.utilities.typing import LambdaContext
+from conversation_store.utils import get_chat_history_store
 from francis_toolkit.utils import get_calling_identity
+from francis_toolkit.warmup import warm_up
 from routes.chat_routes import router as chat_router
 from routes.internal_routes import router as internal_router
 from routes.feedback_routes import router as feedback_router
@@ -29,6 +31,9 @@ app.include_router(internal_router)
 app.include_router(feedback_router)
 app.include_router(summarization_router)
 
+# Load the configuration and create the chat history store of the configured type during the init phase
+warm_up(config=True, steps={"chat_history_store": get_chat_history_store})
+
 
 @logger.inject_lambda_context(log_event=True, correlation_id_path=correlation_paths.API_GATEWAY_REST)
 @tracer.capture_lambda_handler(capture_response=False)
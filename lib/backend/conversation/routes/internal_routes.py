@@ -7,7 +7,7 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from conversation_store import get_chat_history_store
 from conversation_store.utils import update_cost as update_cost_store
 
-from .types import CreateInternalChatMessagesInput, UpdateCostsInput
+from .types import AppendChatTurnInput, UpdateCostsInput
 
 tracer = Tracer()
 router = Router()
@@ -29,37 +29,31 @@ def list_internal_chat_messages(user_id: str, chat_id: str) -> Dict:
     return {"data": {"messages": [message.dict() for message in messages]}}
 
 
-@router.put("/internal/user/<user_id>/chat/<chat_id>/message")
+@router.put("/internal/user/<user_id>/chat/<chat_id>/turn")
 @tracer.capture_method(capture_response=False)
-def add_internal_chat_message(user_id: str, chat_id: str) -> Dict:
-    request = CreateInternalChatMessagesInput(**router.current_event.body)  # type: ignore
+def append_internal_chat_turn(user_id: str, chat_id: str) -> Dict:
+    """
+    Store a question, its answer, the answer sources and the cost of the
+    model call in a single write to the chat history store.
+    """
+    request = AppendChatTurnInput(**router.current_event.body)  # type: ignore
     chat_history_store = get_chat_history_store()
 
-    tokens = router.current_event.body.get("tokens", 0)
-    model_id = router.current_event.body.get("model_id")
-
-    message_type = "ai" if request.role == "assistant" else "human"
-    chat_message = chat_history_store.create_chat_message(
+    human_message, ai_message = chat_history_store.append_turn(
         user_id=user_id,
         chat_id=chat_id,
-        content=request.content,
-        message_type=message_type,
-        tokens=tokens,
+        question=request.question,
+        answer=request.answer,
+        input_tokens=request.input_tokens,
+        output_tokens=request.output_tokens,
+        model_id=request.model_id,
         sources=request.sources,
     )
 
-    message_type = "user" if request.role == "human" else "assistant"
-    chat_history_store.update_cost(
-        user_id=user_id,
-        chat_id=chat_id,
-        tokens=tokens,
-        model_id=model_id,
-        message_type=request.role,
-    )
-
     return {
         "data": {
-            "message": chat_message.dict(),
+            "humanMessage": human_message.dict(),
+            "aiMessage": ai_message.dict(),
         }
     }
 
@@ -1,4 +1,4 @@
-from francis_toolkit.utils import load_config_from_dynamodb
+from francis_toolkit.config import get_system_config
 import os
 from typing import Optional, Iterator
 from conversation_store.utils import get_chat_history_store, update_cost
@@ -56,16 +56,15 @@ def increment_handoff_requests(chat_id: str, user_id: str) -> dict:
 def handoff_chat(chat_id: str, user_id: str) -> dict:
     extra = {"chat_id": chat_id, "user_id": user_id, "event": "handoff_chat"}
     logger.info("Handoff triggered", extra=extra)
-    if not (table_name := os.getenv("CONFIG_TABLE_NAME")):
+    if not os.getenv("CONFIG_TABLE_NAME"):
         raise ValueError("CONFIG_TABLE_NAME environment variable not set")
 
-    if not (system_config := load_config_from_dynamodb(table_name, "system_configuration")):
-        raise ValueError("Failed to load system configuration from DynamoDB")
+    system_config = get_system_config()
 
-    if not (handoff_config := system_config.get("handoffConfig")):
+    if not system_config.handoffConfig:
         raise ValueError("Failed to load handoff configuration from system configuration")
 
-    handoff_config = HandoffConfig(**system_config.get("handoffConfig"))
+    handoff_config = HandoffConfig(**system_config.handoffConfig)
 
     store = get_chat_history_store()
     messages = _depaginated_history(store, chat_id, user_id)
@@ -1,6 +1,6 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -25,13 +25,16 @@ class CreateChatMessageInput(ChatIdMixin):
     question: str
 
 
-class CreateInternalChatMessagesInput(BaseModel):
-    content: str
-    role: Literal["user", "assistant", "system"]
-    sources: Optional[List[Dict[str, Any]]] = None
-
-
 class UpdateCostsInput(BaseModel):
     input_tokens: int
     output_tokens: int
     model_id: str
+
+
+class AppendChatTurnInput(BaseModel):
+    question: str
+    answer: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    model_id: str
+    sources: Optional[List[Dict[str, Any]]] = None
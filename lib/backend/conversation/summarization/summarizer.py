@@ -1,6 +1,6 @@
 from typing import Optional, Iterator
-import boto3
 from conversation_store.base import ChatMessage
+from francis_toolkit.clients import get_client
 from .types import ModelKwargs, HandoffConfig, BedRockLLMModel
 from aws_lambda_powertools import Logger
 
@@ -14,7 +14,7 @@ class Summarizer:
         self.logger = Logger()
         self.handoff_config = handoff_config
 
-        self.bedrock = boto3.client("bedrock-runtime")
+        self.bedrock = get_client("bedrock-runtime")
         self.model_id = handoff_config.modelConfig.modelId
         self.use_system_prompt = handoff_config.modelConfig.supportsSystemPrompt
 
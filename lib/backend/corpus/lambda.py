@@ -1,22 +1,34 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-from aws_lambda_powertools import Logger, Tracer
+import os
+
+from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.event_handler import APIGatewayRestResolver, CORSConfig
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.typing import LambdaContext
+from francis_toolkit.utils import publish_embedding_cache_metrics
+from francis_toolkit.warmup import warm_up
 from routes.embeddings import router as embeddings_router
 from routes.semantic_search import router as semantic_search_router
 
 tracer = Tracer()
 logger = Logger()
+metrics = Metrics(namespace=os.getenv("METRICS_NAMESPACE"))
 app = APIGatewayRestResolver(cors=CORSConfig(allow_origin="*"))
 
 
 app.include_router(semantic_search_router)
 app.include_router(embeddings_router)
 
+# Set up the configuration, database connection and embedding models during the init phase
+warm_up(config=True, database=True, embeddings=True)
+
 
 @logger.inject_lambda_context(log_event=True, correlation_id_path=correlation_paths.API_GATEWAY_REST)
 @tracer.capture_lambda_handler(capture_response=False)
+@metrics.log_metrics
 def handler(event: dict, context: LambdaContext) -> dict:
-    return app.resolve(event, context)
+    try:
+        return app.resolve(event, context)
+    finally:
+        publish_embedding_cache_metrics(metrics)
@@ -1,10 +1,10 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-from typing import Any, Dict, Optional
+from typing import Dict, Optional
 
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler.api_gateway import Router
-from francis_toolkit.utils import get_retriever
+from francis_toolkit.utils import retrieve_documents
 from pydantic import BaseModel
 
 tracer = Tracer()
@@ -25,20 +25,7 @@ class SimilaritySearchRequest(BaseModel):
 def similarity_search_handler() -> Dict:
     request = SimilaritySearchRequest(**router.current_event.body)  # type: ignore
 
-    kw_params: Dict[str, Any] = {}
-
-    if request.limit:
-        kw_params["k"] = int(request.limit)
-
-    if request.threshold:
-        kw_params["score_threshold"] = float(request.threshold)
-
-    retriever = get_retriever(request.modelRefKey, **kw_params)
-    response = retriever.invoke(request.question)
-
-    documents = []
-    for doc in response:
-        documents.append({"pageContent": doc.page_content, "metadata": doc.metadata})
+    documents = retrieve_documents(request.modelRefKey, request.question, k=request.limit, score_threshold=request.threshold)
 
     return {
         "data": {
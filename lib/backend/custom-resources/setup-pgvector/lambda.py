@@ -23,6 +23,12 @@ def setup_pgvector(embedding_models: List) -> None:
     vector_store.create_tables_if_not_exists()
     vector_store.create_collection()
 
+    # Each model has its own collection, indexed for its dimension
+    for embedding_model in embedding_models:
+        model_vector_store = get_vector_store(EmbeddingModel(**embedding_model))
+        model_vector_store.create_collection()
+        model_vector_store.create_vector_index()
+
 
 @logger.inject_lambda_context(log_event=True)
 @tracer.capture_lambda_handler()
@@ -0,0 +1,183 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Incremental decoders of the response streams of SageMaker hosted models.
+
+A decoder is fed the bytes of each PayloadPart event as they arrive and returns the text they complete.
+Bytes are decoded with an incremental UTF-8 decoder, so characters split across events are never
+garbled, and the text is accumulated as a list of deltas rather than by concatenation.
+"""
+import codecs
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Longest prefix kept while looking for the start of the generated text
+_MAX_HEAD_CHARS = 4096
+
+
+class StreamDecoder(ABC):
+    """Turns the bytes of a model response stream into text deltas."""
+
+    def __init__(self) -> None:
+        self._utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._deltas: List[str] = []
+
+    def feed(self, data: bytes) -> str:
+        """Decode the bytes of the next event, returning the text they complete (possibly empty)."""
+        return self._append(self._decode(self._utf8.decode(data)))
+
+    def finish(self) -> str:
+        """Decode the end of the stream, returning the text still pending."""
+        return self._append(self._decode(self._utf8.decode(b"", final=True)) + self._flush())
+
+    @property
+    def text(self) -> str:
+        """The text decoded so far."""
+        return "".join(self._deltas)
+
+    def _append(self, delta: str) -> str:
+        if delta:
+            self._deltas.append(delta)
+        return delta
+
+    @abstractmethod
+    def _decode(self, text: str) -> str:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def _flush(self) -> str:
+        return ""
+
+
+class JsonFieldStreamDecoder(StreamDecoder):
+    """Decodes a single JSON document streamed progressively, such as `{"generated_text": "<output>"}`.
+
+    The text is the value of the first `field` string, with its JSON escapes decoded as they arrive.
+    """
+
+    def __init__(self, field: str = "generated_text") -> None:
+        super().__init__()
+        self._start_pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._head = ""
+        self._started = False
+        self._done = False
+        # Escape sequence cut by the end of an event
+        self._pending = ""
+
+    def _decode(self, text: str) -> str:
+        if self._done:
+            return ""
+        if not self._started:
+            self._head += text
+            match = self._start_pattern.search(self._head)
+            if match is None:
+                self._head = self._head[-_MAX_HEAD_CHARS:]
+                return ""
+            self._started = True
+            text = self._head[match.end() :]
+            self._head = ""
+        return self._decode_string(self._pending + text)
+
+    def _decode_string(self, text: str) -> str:
+        self._pending = ""
+        parts: List[str] = []
+        start = i = 0
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self._done = True
+                break
+            if char != "\\":
+                i += 1
+                continue
+
+            parts.append(text[start:i])
+            escape = text[i : i + 2]
+            if len(escape) < 2:
+                self._pending = text[i:]
+                return "".join(parts)
+            if escape[1] != "u":
+                parts.append(_JSON_ESCAPES.get(escape[1], escape[1]))
+                i += 2
+            else:
+                if len(text) < i + 6:
+                    self._pending = text[i:]
+                    return "".join(parts)
+                code = int(text[i + 2 : i + 6], 16)
+                i += 6
+                if 0xD800 <= code < 0xDC00:
+                    # High surrogate, combined with the low surrogate that follows it
+                    if len(text) < i + 6:
+                        self._pending = text[i - 6 :]
+                        return "".join(parts)
+                    if text[i : i + 2] == "\\u":
+                        low = int(text[i + 2 : i + 6], 16)
+                        if 0xDC00 <= low < 0xE000:
+                            code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                            i += 6
+                parts.append(chr(code))
+            start = i
+        parts.append(text[start:i])
+        return "".join(parts)
+
+
+class TokenStreamDecoder(StreamDecoder):
+    """Decodes line-delimited token events, as streamed by TGI and LMI containers.
+
+    Each line is a JSON object such as `{"token": {"text": " a", "special": false}}`, optionally
+    prefixed by `data:` (server-sent events). Special tokens are skipped.
+    """
+
+    def __init__(self, data_prefix: Optional[str] = None) -> None:
+        super().__init__()
+        self.data_prefix = data_prefix
+        self._line_parts: List[str] = []
+
+    def _decode(self, text: str) -> str:
+        lines = text.split("\n")
+        if len(lines) == 1:
+            self._line_parts.append(text)
+            return ""
+        lines[0] = "".join(self._line_parts) + lines[0]
+        self._line_parts = [lines.pop()]
+        return "".join(self._decode_line(line) for line in lines)
+
+    def _flush(self) -> str:
+        line = "".join(self._line_parts)
+        self._line_parts = []
+        return self._decode_line(line)
+
+    def _decode_line(self, line: str) -> str:
+        line = line.strip()
+        if self.data_prefix and line.startswith(self.data_prefix):
+            line = line[len(self.data_prefix) :].strip()
+        if not line:
+            return ""
+        try:
+            event: Dict[str, Any] = json.loads(line)
+        except json.JSONDecodeError:
+            return ""
+        token = event.get("token") or {}
+        if token.get("special"):
+            return ""
+        return token.get("text") or ""
+
+
+def get_stream_decoder(stream_format: str = "json", output_label: str = "generated_text") -> StreamDecoder:
+    """Return a decoder for the stream format of a model.
+
+    Args:
+    ----
+        stream_format: `json` for a single JSON document (the `output_label` field holds the text),
+            `jsonlines` for line-delimited token events, `sse` for token events sent as server-sent events.
+        output_label: Field of the generated text in the `json` format.
+    """
+    if stream_format == "json":
+        return JsonFieldStreamDecoder(output_label)
+    elif stream_format == "jsonlines":
+        return TokenStreamDecoder()
+    elif stream_format == "sse":
+        return TokenStreamDecoder(data_prefix="data:")
+    raise ValueError(f"Invalid stream format: {stream_format}")
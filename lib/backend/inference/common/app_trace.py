@@ -1,20 +1,24 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
+import threading
 from typing import Any
 
 
 class AppTrace(object):
     def __init__(self) -> None:
         self.trace: dict[str, Any] = {}
+        # Pipeline steps may run on worker threads, so name de-duplication must be atomic
+        self._lock = threading.Lock()
 
     def add(self, name: str, value: Any) -> None:
-        if name in self.trace:
-            base_name = name
-            counter = 1
-            while f"{base_name}_{counter}" in self.trace:
-                counter += 1
-            name = f"{base_name}_{counter}"
-        self.trace[name] = value
+        with self._lock:
+            if name in self.trace:
+                base_name = name
+                counter = 1
+                while f"{base_name}_{counter}" in self.trace:
+                    counter += 1
+                name = f"{base_name}_{counter}"
+            self.trace[name] = value
 
     def reset(self) -> None:
         self.trace = {}
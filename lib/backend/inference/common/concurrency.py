@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+MAX_PIPELINE_WORKERS = 4
+
+# The executor lives at module level so its threads are reused across warm invocations.
+_executor = ThreadPoolExecutor(max_workers=MAX_PIPELINE_WORKERS, thread_name_prefix="rag-pipeline")
+
+
+class SpeculativeTask:
+    """A unit of work started ahead of the point where its result is known to be needed.
+
+    The task runs on the shared pipeline executor and records when it started and finished so
+    callers can report how much of its runtime overlapped with other steps.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        self.name = name
+        self.submitted_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._future: Future = _executor.submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        self.started_at = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the task and return its result, re-raising any exception it raised."""
+        return self._future.result(timeout=timeout)
+
+    def discard(self) -> None:
+        """Throw the result away.
+
+        A task that has not started yet is cancelled. A running task cannot be interrupted, so we
+        wait for it to finish and swallow its outcome: Lambda freezes the process once the handler
+        returns, and a thread left running would resume inside the next invocation. Discarding a task
+        whose result was already consumed does nothing.
+        """
+        if self._future.cancel():
+            return
+        try:
+            self._future.result()
+        except Exception as e:
+            logger.debug(f"Discarded speculative task '{self.name}' failed: {e}")
+
+    def elapsed_ms(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return (self.finished_at - self.started_at) * 1000
+
+
+def overlap_ms(task: SpeculativeTask, start: float, end: float) -> float:
+    """Return how many milliseconds of the task ran inside the [start, end] perf_counter window."""
+    if task.started_at is None:
+        return 0.0
+    task_end = task.finished_at if task.finished_at is not None else end
+    return max(0.0, (min(task_end, end) - max(task.started_at, start)) * 1000)
@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from aws_lambda_powertools import Logger
+from francis_toolkit.utils import invoke_lambda_function, retrieve_documents
+
+logger = Logger()
+
+CORPUS_LAMBDA_FUNC_NAME = os.getenv("CORPUS_LAMBDA_FUNC_NAME", "")
+
+# "lambda" invokes the corpus Lambda, "in_process" queries the retriever from this Lambda
+CORPUS_RETRIEVAL_TRANSPORT = os.getenv("CORPUS_RETRIEVAL_TRANSPORT", "lambda")
+
+
+class RetrievalTransport(ABC):
+    """Transport used by the inference chain to run a corpus similarity search."""
+
+    @abstractmethod
+    def search(
+        self,
+        question: str,
+        model_ref_key: str,
+        corpus_limit: Optional[int],
+        corpus_similarity_threshold: Optional[float] = 0.5,
+    ) -> list:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+
+class LambdaRetrievalTransport(RetrievalTransport):
+    """Runs the search through the `/corpus/search` route of the corpus Lambda."""
+
+    def __init__(self, function_name: str = CORPUS_LAMBDA_FUNC_NAME) -> None:
+        self.function_name = function_name
+
+    def search(
+        self,
+        question: str,
+        model_ref_key: str,
+        corpus_limit: Optional[int],
+        corpus_similarity_threshold: Optional[float] = 0.5,
+    ) -> list:
+        request_payload = {
+            "path": "/corpus/search",
+            "httpMethod": "POST",
+            "queryStringParameters": {},
+        }
+        body = {
+            "question": question,
+            "modelRefKey": model_ref_key,
+        }
+
+        if corpus_limit:
+            body["limit"] = str(corpus_limit)
+        else:
+            body["threshold"] = str(corpus_similarity_threshold)
+
+        request_payload["body"] = body
+
+        response = invoke_lambda_function(self.function_name, request_payload)
+
+        return response["documents"]  # type: ignore
+
+
+class InProcessRetrievalTransport(RetrievalTransport):
+    """Runs the search with the corpus retriever directly, avoiding a Lambda invoke and the
+    JSON round trip of every retrieved document.
+
+    The inference Lambda needs the same vector store / knowledge base access as the corpus Lambda.
+    """
+
+    def search(
+        self,
+        question: str,
+        model_ref_key: str,
+        corpus_limit: Optional[int],
+        corpus_similarity_threshold: Optional[float] = 0.5,
+    ) -> list:
+        if corpus_limit:
+            return retrieve_documents(model_ref_key, question, k=int(corpus_limit))
+        return retrieve_documents(model_ref_key, question, score_threshold=corpus_similarity_threshold)
+
+
+_retrieval_transport: RetrievalTransport | None = None
+
+
+def get_retrieval_transport() -> RetrievalTransport:
+    global _retrieval_transport
+    if _retrieval_transport is None:
+        if CORPUS_RETRIEVAL_TRANSPORT == "in_process":
+            _retrieval_transport = InProcessRetrievalTransport()
+        elif CORPUS_RETRIEVAL_TRANSPORT == "lambda":
+            _retrieval_transport = LambdaRetrievalTransport()
+        else:
+            raise ValueError(f"Invalid corpus retrieval transport: {CORPUS_RETRIEVAL_TRANSPORT}")
+        logger.debug(f"Using {type(_retrieval_transport).__name__} for corpus retrieval")
+    return _retrieval_transport
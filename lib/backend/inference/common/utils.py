@@ -9,7 +9,8 @@ from enum import Enum
 
 import botocore
 from aws_lambda_powertools import Logger, Tracer
-from francis_toolkit.clients import s3_client
+from common.retrieval import get_retrieval_transport
+from francis_toolkit.clients import get_client
 from francis_toolkit.utils import invoke_lambda_function
 
 logger = Logger()
@@ -24,7 +25,6 @@ class HandoffState(Enum):
 
 
 CONVERSATION_LAMBDA_FUNC_NAME = os.getenv("CONVERSATION_LAMBDA_FUNC_NAME", "")
-CORPUS_LAMBDA_FUNC_NAME = os.getenv("CORPUS_LAMBDA_FUNC_NAME", "")
 
 
 def format_chat_history(history: list) -> str:
@@ -62,6 +62,19 @@ def parse_standalone_response(llm_response: str) -> Optional[str]:
     return llm_response
 
 
+def normalize_question(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", question.casefold()).split())
+
+
+def is_same_question(question: str, other_question: str) -> bool:
+    """Check whether two questions can share the same retrieval results.
+
+    The comparison ignores case, punctuation and whitespace but nothing else: questions a few characters
+    apart often differ in the one entity that matters, e.g. "hours on monday" and "hours on sunday".
+    """
+    return normalize_question(question) == normalize_question(other_question)
+
+
 def parse_qa_response(llm_response: str, pattern: str | None = None) -> str:
     # TODO: Handle other formating (if any) here
     final = llm_response
@@ -126,7 +139,7 @@ def download_image_from_s3(s3_url: str) -> bytearray | None:
 
     try:
         # Download the image from S3
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+        response = get_client("s3").get_object(Bucket=bucket_name, Key=object_key)
         image_data = response["Body"].read()
 
         # Convert the image data to a bytearray
@@ -138,6 +151,7 @@ def download_image_from_s3(s3_url: str) -> bytearray | None:
         return None
 
 
+@tracer.capture_method
 def store_messages_in_history(
     user_id: str,
     chat_id: str,
@@ -148,65 +162,42 @@ def store_messages_in_history(
     model_id: str,
     documents: Optional[list] = None,
 ) -> tuple:
-    human_message = create_message_in_history(role="user", message=user_q, chat_id=chat_id, user_id=user_id, tokens=input_tokens, model_id=model_id)
-
-    ai_message = create_message_in_history(
-        role="assistant",
-        message=answer,
-        chat_id=chat_id,
-        user_id=user_id,
-        tokens=output_tokens,
-        model_id=model_id,
-        documents=documents,
-    )
-
-    return human_message, ai_message
-
-
-@tracer.capture_method
-def create_message_in_history(
-    user_id: str,
-    chat_id: str,
-    role: str,
-    message: str,
-    tokens: int,
-    model_id: str,
-    documents: Optional[list] = None,
-) -> dict:
-    """Put a message in the conversation history.
+    """Store a question and its answer in the conversation history with a single invoke.
 
     Args:
     ----
-        role (str): The role of the message sender (e.g., "user", "assistant").
-        message (str): The message content.
-        chat_id (str): The ID of the chat session.
         user_id (str): The ID of the user.
-        documents (list, optional): A list of documents to include as sources.
+        chat_id (str): The ID of the chat session.
+        user_q (str): The question of the user.
+        answer (str): The answer of the assistant.
+        input_tokens (int): The number of input tokens of the model call.
+        output_tokens (int): The number of output tokens of the model call.
+        model_id (str): The ID of the model used to answer.
+        documents (list, optional): A list of documents to include as sources of the answer.
 
     Returns:
     -------
-        None
+        tuple: The stored human message and AI message.
     """
     request_payload = {
-        "path": f"/internal/user/{user_id}/chat/{chat_id}/message",
+        "path": f"/internal/user/{user_id}/chat/{chat_id}/turn",
         "httpMethod": "PUT",
         "pathParameters": {"user_id": user_id, "chat_id": chat_id},
+        "body": {
+            "question": user_q,
+            "answer": answer,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "model_id": model_id,
+        },
     }
 
     if documents:
-        request_payload["body"] = {
-            "role": role,
-            "content": message,
-            "tokens": tokens,
-            "model_id": model_id,
-            "sources": documents,
-        }
-    else:
-        request_payload["body"] = {"role": role, "content": message, "tokens": tokens, "model_id": model_id}
+        request_payload["body"]["sources"] = documents  # type: ignore
 
     response = invoke_lambda_function(CONVERSATION_LAMBDA_FUNC_NAME, request_payload)
 
-    return response["message"]  # type: ignore
+    return response["humanMessage"], response["aiMessage"]  # type: ignore
 
 
 @tracer.capture_method
@@ -277,7 +268,7 @@ def get_corpus_documents(
     corpus_limit: Optional[int],
     corpus_similarity_threshold: Optional[float] = 0.5,
 ) -> list:
-    """Invokes a Lambda function to perform a similarity search.
+    """Performs a similarity search through the configured retrieval transport.
 
     Args:
     ----
@@ -287,23 +278,9 @@ def get_corpus_documents(
     -------
         List of documents
     """
-    request_payload = {
-        "path": "/corpus/search",
-        "httpMethod": "POST",
-        "queryStringParameters": {},
-    }
-    body = {
-        "question": question,
-        "modelRefKey": model_ref_key,
-    }
-
-    if corpus_limit:
-        body["limit"] = str(corpus_limit)
-    else:
-        body["threshold"] = str(corpus_similarity_threshold)
-
-    request_payload["body"] = body
-
-    response = invoke_lambda_function(CORPUS_LAMBDA_FUNC_NAME, request_payload)
-
-    return response["documents"]  # type: ignore
+    return get_retrieval_transport().search(
+        question=question,
+        model_ref_key=model_ref_key,
+        corpus_limit=corpus_limit,
+        corpus_similarity_threshold=corpus_similarity_threshold,
+    )
@@ -2,17 +2,40 @@
 # SPDX-License-Identifier: Apache-2.0
 import json
 import os
+import threading
+import time
+from typing import Any, List, Optional
 
-import boto3
+from aws_lambda_powertools import Logger
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from francis_toolkit.clients import dynamodb_resource_client
+from common.app_trace import app_trace
+from common.types import StreamingContext
+from francis_toolkit.clients import get_client, get_resource
 
-# Create a Boto3 client for API Gateway Management API
-apigw_mgmt_client = boto3.client("apigatewaymanagementapi", endpoint_url=os.environ.get("WEBSOCKET_CALLBACK_URL"))
+logger = Logger()
+
+# Configuration of the API Gateway Management API client, shared by every invocation of the execution environment.
+# Posts are small and frequent: keep the connections alive, fail fast and only retry transient errors a few times.
+APIGW_MGMT_CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.getenv("APIGW_MAX_POOL_CONNECTIONS", "10")),
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=5,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+
+# Streamed chunks are sent at the latest this long after they are received, or as soon as this many characters are buffered
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "30"))
+STREAM_FLUSH_SIZE = int(os.getenv("STREAM_FLUSH_SIZE", "200"))
+
+
+class StreamingError(Exception):
+    """A streamed answer could not be sent to the client."""
 
 
 def get_connection(table_name: str, connection_id: str) -> dict:
-    table = dynamodb_resource_client.Table(table_name)
+    table = get_resource("dynamodb").Table(table_name)
 
     try:
         response = table.get_item(Key={"PK": connection_id})
@@ -31,12 +54,173 @@ def stream_llm_response(connection_id: str, input_data: dict) -> None:
     post_to_connection(connection_id, payload)
 
 
-def update_inference_status(connection_id: str, input_data: dict) -> None:
-    """Send a message to a connected client with the route 'UpdateInferenceStatus'."""
+def update_inference_status(connection_id: str, input_data: dict) -> bool:
+    """Send a message to a connected client with the route 'UpdateInferenceStatus'.
+
+    Returns False if the client has disconnected.
+    """
     payload = {"route": "UpdateInferenceStatus", "payload": input_data}
-    post_to_connection(connection_id, payload)
+    try:
+        post_to_connection(connection_id, payload)
+    except ClientError as e:
+        if not is_connection_gone(e):
+            raise
+        logger.info(f"Connection {connection_id} is gone")
+        return False
+    return True
+
+
+def get_apigw_mgmt_client() -> Any:
+    """Return the API Gateway Management API client of the WebSocket API, creating it on first use."""
+    return get_client(
+        "apigatewaymanagementapi", endpoint_url=os.environ.get("WEBSOCKET_CALLBACK_URL"), config=APIGW_MGMT_CLIENT_CONFIG
+    )
 
 
 def post_to_connection(connection_id: str, input_data: dict) -> None:
     """Send a message to a connected client."""
-    apigw_mgmt_client.post_to_connection(Data=json.dumps(input_data).encode("utf-8"), ConnectionId=connection_id)
+    get_apigw_mgmt_client().post_to_connection(Data=json.dumps(input_data).encode("utf-8"), ConnectionId=connection_id)
+
+
+def is_connection_gone(error: Exception) -> bool:
+    """Whether a post failed because the client has disconnected."""
+    return isinstance(error, ClientError) and error.response["Error"]["Code"] == "GoneException"
+
+
+class StreamingSink:
+    """Sends the chunks of a streamed answer to a WebSocket client, coalescing them into fewer messages.
+
+    Chunks are buffered and posted by a background thread, so reading the model stream is never blocked
+    by a post. The buffer is flushed `flush_interval_ms` after its first chunk was written, or as soon as
+    it holds `flush_size` characters. While a post is in flight, chunks keep accumulating, so a slow
+    connection gets fewer, larger messages. Messages are posted in order, by a single thread.
+
+    When a post fails, `cancelled` is set, so that the producer can stop the generation. If the client has
+    disconnected, the rest of the answer is dropped silently; any other error is raised by `close` as a
+    `StreamingError`.
+
+    Example:
+        .. code-block:: python
+
+            with StreamingSink(streaming_context) as sink:
+                for text in stream:
+                    sink.write(text)
+    """
+
+    def __init__(
+        self,
+        streaming_context: StreamingContext,
+        flush_interval_ms: int = STREAM_FLUSH_INTERVAL_MS,
+        flush_size: int = STREAM_FLUSH_SIZE,
+    ) -> None:
+        self.streaming_context = streaming_context
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_size = flush_size
+        self.chunk_count = 0
+        self.flush_count = 0
+        self.post_seconds = 0.0
+        self.error: Optional[Exception] = None
+        self._cancelled = threading.Event()
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._first_buffered_at = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="streaming-sink", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "StreamingSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether a post has failed, in which case nothing more is sent."""
+        return self._cancelled.is_set()
+
+    def write(self, chunk: str) -> None:
+        if not chunk:
+            return
+        with self._condition:
+            was_empty = not self._buffer
+            if was_empty:
+                self._first_buffered_at = time.monotonic()
+            self._buffer.append(chunk)
+            self._buffered_chars += len(chunk)
+            self.chunk_count += 1
+            # The first chunk starts the flush interval of the sender thread, which otherwise waits for the buffer to fill
+            if was_empty or self._buffered_chars >= self.flush_size:
+                self._condition.notify()
+
+    def close(self) -> None:
+        """Send the buffered chunks and wait for every message to be posted.
+
+        Raises:
+        ------
+            StreamingError: A post has failed for another reason than the client having disconnected.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        app_trace.add(
+            "streaming",
+            {
+                "chunks": self.chunk_count,
+                "flushes": self.flush_count,
+                "postMs": round(self.post_seconds * 1000, 1),
+                "error": str(self.error) if self.error else None,
+                "cancelled": self.cancelled,
+            },
+        )
+        if self.error is not None and not is_connection_gone(self.error):
+            connection_id = self.streaming_context.connectionId
+            raise StreamingError(f"Failed to stream the response to connection {connection_id}") from self.error
+
+    def _take_buffer(self) -> Optional[List[str]]:
+        """Wait until the buffer is due to be flushed and take it, or return None once closed and empty."""
+        with self._condition:
+            while True:
+                if self._buffer:
+                    if self._closed or self._buffered_chars >= self.flush_size:
+                        break
+                    remaining = self._first_buffered_at + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._condition.wait()
+
+            chunks = self._buffer
+            self._buffer = []
+            self._buffered_chars = 0
+            return chunks
+
+    def _run(self) -> None:
+        while (chunks := self._take_buffer()) is not None:
+            if self.error is not None:
+                # A post has failed, the rest of the answer is dropped and the producer stops the generation
+                continue
+            started_at = time.monotonic()
+            try:
+                stream_llm_response(
+                    self.streaming_context.connectionId,
+                    {
+                        "chatId": self.streaming_context.chatId,
+                        "messageId": self.streaming_context.messageId,
+                        "chunks": chunks,
+                    },
+                )
+                self.flush_count += 1
+            except Exception as e:
+                if is_connection_gone(e):
+                    logger.info(f"Connection {self.streaming_context.connectionId} is gone, cancelling the stream")
+                else:
+                    logger.error(f"Failed to stream the response to connection {self.streaming_context.connectionId}: {e}")
+                self.error = e
+                self._cancelled.set()
+            self.post_seconds += time.monotonic() - started_at
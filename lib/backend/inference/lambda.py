@@ -4,7 +4,7 @@
 import json
 import os
 
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.event_handler import APIGatewayRestResolver, CORSConfig
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.data_classes import (
@@ -14,19 +14,24 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from common.types import StreamingContext, WebSocketChatMessageInput
 from common.utils import add_and_check_handoff
 from common.websocket_utils import (
+    get_apigw_mgmt_client,
     get_connection,
     update_inference_status,
 )
+from francis_toolkit.config import get_system_config
 from francis_toolkit.utils import (
     find_embedding_model_by_ref_key,
     get_calling_identity,
-    load_config_from_dynamodb,
+    publish_embedding_cache_metrics,
 )
+from francis_toolkit.warmup import warm_up
 from llms.chains import run_rag_chain
+from llms.models import warm_up_model_clients
 from routes.inference_routes import router as inference_routes
 
 tracer = Tracer()
 logger = Logger()
+metrics = Metrics(namespace=os.getenv("METRICS_NAMESPACE"))
 app = APIGatewayRestResolver(
     cors=CORSConfig(
         allow_origin="*",
@@ -35,15 +40,28 @@ app = APIGatewayRestResolver(
 )
 app.include_router(inference_routes)
 
+# Set up the configuration, clients and embedding models during the init phase, so that the first request does not pay for them
+warm_up(
+    config=True,
+    embeddings=True,
+    clients=("lambda",),
+    resources=("dynamodb",),
+    steps={"client:apigatewaymanagementapi": get_apigw_mgmt_client, "model_clients": warm_up_model_clients},
+)
+
 
 @logger.inject_lambda_context(log_event=True, correlation_id_path=correlation_paths.API_GATEWAY_REST)
 @tracer.capture_lambda_handler
+@metrics.log_metrics
 def handler(event: dict, context: LambdaContext) -> dict:
     # Check if the event is from another Lambda function
-    if is_lambda_invocation_event(event):
-        return handle_lambda_invocation_event(event, context)
-    else:
-        return handle_api_gateway_event(event, context)
+    try:
+        if is_lambda_invocation_event(event):
+            return handle_lambda_invocation_event(event, context)
+        else:
+            return handle_api_gateway_event(event, context)
+    finally:
+        publish_embedding_cache_metrics(metrics)
 
 
 def is_lambda_invocation_event(event: dict) -> bool:
@@ -77,15 +95,15 @@ def handle_lambda_invocation_event(event: dict, context: LambdaContext) -> dict:
     if not embedding_model:
         raise ValueError("Invalid model reference key")
 
-    system_config = load_config_from_dynamodb(os.getenv("CONFIG_TABLE_NAME"), "system_configuration")
-    llm_config = system_config["llmConfig"]
+    system_config = get_system_config()
+    llm_config = system_config.llmConfig
     streaming = llm_config.get("streaming", False)
     if not streaming:
         raise ValueError("Streaming is not enabled")
 
-    handoff_config = system_config.get("handoffConfig")
+    handoff_config = system_config.handoffConfig
 
-    update_inference_status(
+    connected = update_inference_status(
         connection_id,
         {
             "chatId": request.chatId,
@@ -95,6 +113,9 @@ def handle_lambda_invocation_event(event: dict, context: LambdaContext) -> dict:
             "payload": request.question,
         },
     )
+    if not connected:
+        # The client left before the answer was generated
+        return {"statusCode": 410, "body": json.dumps({"data": {"message": "Connection is gone"}})}
 
     result = run_rag_chain(
         llm_config=llm_config,
@@ -1,15 +1,20 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-from typing import Optional, Callable
+import os
+import time
+from typing import TYPE_CHECKING, List, Optional, Callable, Tuple
 
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools.metrics import MetricUnit
 from common.app_trace import app_trace
+from common.concurrency import SpeculativeTask, overlap_ms
 from common.types import ClassificationType, StreamingContext
 from common.utils import (
     format_chat_history,
     format_documents,
     get_corpus_documents,
     get_message_history,
+    is_same_question,
     parse_classification_response,
     parse_qa_response,
     parse_standalone_response,
@@ -17,12 +22,17 @@ from common.utils import (
 )
 from common.websocket_utils import stream_llm_response
 from francis_toolkit.types import EmbeddingModel
+from francis_toolkit.utils import get_embeddings
 from common.utils import add_and_check_handoff, HandoffState
 
 from .models import get_llm_class, get_reranker_class
 
+if TYPE_CHECKING:
+    from francis_toolkit.answer_cache import CachedAnswer
+
 logger = Logger()
 tracer = Tracer()
+metrics = Metrics(namespace=os.getenv("METRICS_NAMESPACE"))
 
 DEFAULT_HANDOFF_THRESHOLD = 3
 
@@ -39,6 +49,54 @@ def get_handoff_prompt(handoff_state: HandoffState, handoff_config: dict) -> str
         return handoff_prompts.get("handoffRequested", "")
 
 
+def _trace_speculation(task: SpeculativeTask, window_start: float, window_end: float, used: bool) -> None:
+    app_trace.add(
+        f"speculative_{task.name}",
+        {
+            "used": used,
+            "elapsed_ms": round(task.elapsed_ms(), 1),
+            "overlap_ms": round(overlap_ms(task, window_start, window_end), 1),
+        },
+    )
+
+
+def _lookup_cached_answer(
+    answer_cache_config: dict, embedding_model: EmbeddingModel, question: str
+) -> Tuple[Optional["CachedAnswer"], Optional[List[float]]]:
+    """Look the question up in the answer cache. Cache failures are logged and count as a miss."""
+    # The cache pulls in NumPy, SQLAlchemy and the vector store, only loaded when it is enabled
+    from francis_toolkit.answer_cache import get_answer_cache
+
+    try:
+        embedding = get_embeddings(embedding_model).embed_query(question)
+        cached_answer = get_answer_cache(answer_cache_config).lookup(embedding_model.modelRefKey, embedding)
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed: {e}")
+        return None, None
+
+    if cached_answer is not None:
+        app_trace.add(
+            "answer_cache",
+            {"hit": True, "similarity": round(cached_answer.similarity, 4), "cached_question": cached_answer.question},
+        )
+    else:
+        app_trace.add("answer_cache", {"hit": False})
+    metrics.add_metric(name="AnswerCacheHit" if cached_answer else "AnswerCacheMiss", unit=MetricUnit.Count, value=1)
+
+    return cached_answer, embedding
+
+
+def _cache_answer(
+    answer_cache_config: dict, embedding_model: EmbeddingModel, question: str, embedding: List[float], answer: str, documents: list
+) -> None:
+    from francis_toolkit.answer_cache import get_answer_cache
+
+    try:
+        get_answer_cache(answer_cache_config).put(embedding_model.modelRefKey, question, embedding, answer, documents)
+    except Exception as e:
+        logger.warning(f"Failed to cache the answer: {e}")
+
+
 @tracer.capture_method(capture_response=False)
 def run_rag_chain(
     llm_config: dict,
@@ -65,63 +123,156 @@ def run_rag_chain(
 
     model_config = llm_config["classificationChainConfig"]["modelConfig"]
 
-    if "classificationChainConfig" in llm_config:
-        # classify the user question
-        classification_response, input_tokens, output_tokens = (
-            run_classification_step(
-                chain_config=llm_config["classificationChainConfig"],
-                question=user_q,
-                on_handoff_triggered=handoff_trigger_counter,
-                handoff_config=handoff_config,
+    # Tasks started ahead of classification, discarded on every path that does not consume them: a
+    # worker thread left running would resume inside the next invocation once Lambda thaws the process.
+    speculative_standalone: Optional[SpeculativeTask] = None
+    speculative_retrieval: Optional[SpeculativeTask] = None
+    try:
+        # In concurrent mode the standalone rewrite (including its conversation history fetch) starts
+        # while classification is still running, and is discarded if classification short-circuits.
+        if (
+            llm_config.get("concurrentPreprocessing", False)
+            and "classificationChainConfig" in llm_config
+            and "standaloneChainConfig" in llm_config
+        ):
+            speculative_standalone = SpeculativeTask(
+                "standalone",
+                run_standalone_step,
+                chain_config=llm_config["standaloneChainConfig"],
+                history_limit=llm_config.get("maxConversationHistory", 5),
+                user_q=user_q,
+                chat_id=chat_id,
+                user_id=user_id,
             )
-            or {}
-        )
 
-        app_trace.add("classification_response", classification_response)
-        if "classification_type" in classification_response:
-            classification_type = classification_response["classification_type"]  # type: ignore
+        # In speculative retrieval mode the raw question is searched against the corpus while
+        # classification runs. The result is reused if the standalone question turns out the same.
+        if llm_config.get("speculativeRetrieval", False):
+            speculative_retrieval = SpeculativeTask(
+                "retrieval",
+                get_corpus_documents,
+                question=user_q,
+                corpus_limit=llm_config.get("maxCorpusDocuments", 5),
+                corpus_similarity_threshold=llm_config.get("corpusSimilarityThreshold", 0.25),
+                model_ref_key=embedding_model.modelRefKey,
+            )
 
-        if (
-            classification_type == ClassificationType.GREETINGS_FAREWELLS
-            or classification_type == ClassificationType.UNRELATED
-            or classification_type == ClassificationType.HANDOFF_REQUEST
-        ):
-            answer = classification_response.get("response", "")
-            app_trace.add("answer", answer)
-
-            if streaming_context is not None:
-                stream_llm_response(
-                    streaming_context.connectionId,
-                    {
-                        "chatId": streaming_context.chatId,
-                        "messageId": streaming_context.messageId,
-                        "chunks": [answer],
-                    },
+        classification_started_at = classification_finished_at = time.perf_counter()
+        if "classificationChainConfig" in llm_config:
+            # classify the user question
+            classification_response, input_tokens, output_tokens = (
+                run_classification_step(
+                    chain_config=llm_config["classificationChainConfig"],
+                    question=user_q,
+                    on_handoff_triggered=handoff_trigger_counter,
+                    handoff_config=handoff_config,
+                )
+                or {}
+            )
+            classification_finished_at = time.perf_counter()
+
+            app_trace.add("classification_response", classification_response)
+            if "classification_type" in classification_response:
+                classification_type = classification_response["classification_type"]  # type: ignore
+
+            if (
+                classification_type == ClassificationType.GREETINGS_FAREWELLS
+                or classification_type == ClassificationType.UNRELATED
+                or classification_type == ClassificationType.HANDOFF_REQUEST
+            ):
+                answer = classification_response.get("response", "")
+                app_trace.add("answer", answer)
+
+                if streaming_context is not None:
+                    stream_llm_response(
+                        streaming_context.connectionId,
+                        {
+                            "chatId": streaming_context.chatId,
+                            "messageId": streaming_context.messageId,
+                            "chunks": [answer],
+                        },
+                    )
+
+                human_message, ai_message = store_messages_in_history(
+                    user_id=user_id, chat_id=chat_id, user_q=user_q, answer=answer, documents=[], input_tokens=input_tokens, output_tokens=output_tokens, model_id=model_config['modelId']
                 )
 
-            human_message, ai_message = store_messages_in_history(
-                user_id=user_id, chat_id=chat_id, user_q=user_q, answer=answer, documents=[], input_tokens=input_tokens, output_tokens=output_tokens, model_id=model_config['modelId']
+                # Only waited for once the canned answer is sent and stored, the `finally` block discards the retrieval
+                if speculative_standalone is not None:
+                    speculative_standalone.discard()
+                    _trace_speculation(speculative_standalone, classification_started_at, classification_finished_at, used=False)
+
+                return {
+                    "question": {**human_message, "text": user_q},
+                    "answer": {**ai_message, "text": answer},
+                    "sources": ai_message.get("sources"),
+                    "traceData": app_trace.get_trace(),
+                    "handoffTriggered": classification_response.get("handoff_state"),
+                }
+
+        standalone_q = user_q
+        if speculative_standalone is not None:
+            standalone_q = speculative_standalone.result()
+            _trace_speculation(speculative_standalone, classification_started_at, classification_finished_at, used=True)
+            app_trace.add("standalone_question", standalone_q)
+        elif "standaloneChainConfig" in llm_config:
+            # condense the follow up question into a standalone question
+            standalone_q = run_standalone_step(
+                chain_config=llm_config["standaloneChainConfig"],
+                history_limit=llm_config.get("maxConversationHistory", 5),
+                user_q=user_q,
+                chat_id=chat_id,
+                user_id=user_id,
             )
+            app_trace.add("standalone_question", standalone_q)
+
+        # Answers are cached by standalone question, which already carries the conversation context
+        answer_cache_config = llm_config.get("answerCacheConfig") or {}
+        question_embedding: Optional[List[float]] = None
+        if answer_cache_config.get("enabled", False) and classification_type != ClassificationType.PROMOTION:
+            cached_answer, question_embedding = _lookup_cached_answer(answer_cache_config, embedding_model, standalone_q)
+            if cached_answer is not None:
+                # The speculative retrieval is discarded by the `finally` block, once the answer is sent and stored
+                answer = cached_answer.answer
+                app_trace.add("answer", answer)
+                app_trace.add("documents", cached_answer.sources)
+
+                if streaming_context is not None:
+                    stream_llm_response(
+                        streaming_context.connectionId,
+                        {
+                            "chatId": streaming_context.chatId,
+                            "messageId": streaming_context.messageId,
+                            "chunks": [answer],
+                        },
+                    )
+
+                human_message, ai_message = store_messages_in_history(
+                    user_id=user_id, chat_id=chat_id, user_q=user_q, answer=answer, documents=[], input_tokens=0, output_tokens=0, model_id=model_config['modelId']
+                )
 
-            return {
-                "question": {**human_message, "text": user_q},
-                "answer": {**ai_message, "text": answer},
-                "sources": ai_message.get("sources"),
-                "traceData": app_trace.get_trace(),
-                "handoffTriggered": classification_response.get("handoff_state"),
-            }
-
-    standalone_q = user_q
-    if "standaloneChainConfig" in llm_config:
-        # condense the follow up question into a standalone question
-        standalone_q = run_standalone_step(
-            chain_config=llm_config["standaloneChainConfig"],
-            history_limit=llm_config.get("maxConversationHistory", 5),
-            user_q=user_q,
-            chat_id=chat_id,
-            user_id=user_id,
-        )
-        app_trace.add("standalone_question", standalone_q)
+                return {
+                    "question": {**human_message, "text": user_q},
+                    "answer": {**ai_message, "text": answer},
+                    "sources": ai_message.get("sources"),
+                    "traceData": app_trace.get_trace(),
+                }
+
+        prefetched_documents = None
+        if speculative_retrieval is not None:
+            used = classification_type != ClassificationType.PROMOTION and is_same_question(user_q, standalone_q)
+            if used:
+                prefetched_documents = speculative_retrieval.result()
+            else:
+                speculative_retrieval.discard()
+            _trace_speculation(speculative_retrieval, classification_started_at, time.perf_counter(), used=used)
+            metrics.add_metric(
+                name="SpeculativeRetrievalUsed" if used else "SpeculativeRetrievalDiscarded", unit=MetricUnit.Count, value=1
+            )
+    finally:
+        for task in (speculative_standalone, speculative_retrieval):
+            if task is not None:
+                task.discard()
 
     answer, documents, input_tokens, output_tokens = run_qa_step(
         chain_config=llm_config["qaChainConfig"],
@@ -132,11 +283,15 @@ def run_rag_chain(
         reranking_config=llm_config.get("rerankingConfig"),
         classification_type=classification_type,
         streaming_context=streaming_context,
+        prefetched_documents=prefetched_documents,
     )
 
     app_trace.add("answer", answer)
     app_trace.add("documents", documents)
 
+    if question_embedding is not None:
+        _cache_answer(answer_cache_config, embedding_model, standalone_q, question_embedding, answer, documents)
+
     human_message, ai_message = store_messages_in_history(
         user_id=user_id, chat_id=chat_id, user_q=user_q, answer=answer, documents=[], input_tokens=input_tokens, output_tokens=output_tokens, model_id=model_config['modelId']
     )
@@ -159,16 +314,17 @@ def run_qa_step(
     reranking_config: Optional[dict] = None,
     classification_type: ClassificationType = ClassificationType.QUESTION,
     streaming_context: Optional[StreamingContext] = None,
+    prefetched_documents: Optional[list] = None,
 ) -> tuple[str, list]:
     model_config = chain_config["modelConfig"]
-    kwargs = chain_config.get("kwargs", {})
-
     llm = get_llm_class(model_config.get("provider"), model_config.get("region", None))
     documents = []
     context = "No context document found"
 
     if classification_type == ClassificationType.PROMOTION:
         context = "Refer to the associated image"
+    elif prefetched_documents is not None:
+        documents = prefetched_documents
     else:
         documents = get_corpus_documents(
             question=question,
@@ -177,19 +333,19 @@ def run_qa_step(
             model_ref_key=embedding_model.modelRefKey,
         )
 
-        if documents:
-            if reranking_config:
-                reranking_model_config = reranking_config.get("modelConfig", {})
-                reranker = get_reranker_class(reranking_model_config.get("provider"), reranking_model_config.get("region"))
-                reranking_kwargs = reranking_config.get("kwargs", {})
-                reranked_documents = reranker.rerank_text(
-                    reranker_config=reranking_config, query=question, documents=documents, **reranking_kwargs
-                )
-                documents = reranked_documents
-            context = format_documents(documents)
+    if documents:
+        if reranking_config:
+            reranking_model_config = reranking_config.get("modelConfig", {})
+            reranker = get_reranker_class(reranking_model_config.get("provider"), reranking_model_config.get("region"))
+            reranking_kwargs = reranking_config.get("kwargs", {})
+            reranked_documents = reranker.rerank_text(
+                reranker_config=reranking_config, query=question, documents=documents, **reranking_kwargs
+            )
+            documents = reranked_documents
+        context = format_documents(documents)
 
-    kwargs["context"] = context
-    kwargs["question"] = question
+    # The chain config is shared by every request of the execution environment, so it must not be mutated
+    kwargs = {**chain_config.get("kwargs", {}), "context": context, "question": question}
 
     llm_response, input_tokens, output_tokens = llm.call_text_llms(
         model_config=model_config,
@@ -219,9 +375,7 @@ def run_standalone_step(chain_config: dict, history_limit: int, user_q: str, cha
 
     llm = get_llm_class(model_config.get("provider"), model_config.get("region", None))
 
-    kwargs = chain_config.get("kwargs", {})
-    kwargs["chat_history"] = chat_history
-    kwargs["question"] = user_q
+    kwargs = {**chain_config.get("kwargs", {}), "chat_history": chat_history, "question": user_q}
 
     llm_response, input_tokens, output_tokens = llm.call_text_llms(
         model_config=model_config,
@@ -249,8 +403,7 @@ def run_classification_step(
     model_config = chain_config["modelConfig"]
     llm = get_llm_class(model_config.get("provider"), model_config.get("region", None))
 
-    kwargs = chain_config.get("kwargs", {})
-    kwargs["question"] = question
+    kwargs = {**chain_config.get("kwargs", {}), "question": question}
 
     llm_response, input_tokens, output_tokens = llm.call_text_llms(
         model_config=model_config,
@@ -1,25 +1,35 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
+import math
 import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-import boto3
 import botocore
 from adapters.sagemaker_content_handler import (
     SagemakerContentHandler,
 )
+from adapters.stream_decoders import get_stream_decoder
 from aws_lambda_powertools import Logger
 from common.app_trace import app_trace
 from common.types import ClassificationType, StreamingContext
 from common.utils import download_image_from_s3, format_template_variables
-from common.websocket_utils import stream_llm_response
+from common.websocket_utils import StreamingError, StreamingSink, stream_llm_response
+from francis_toolkit.clients import get_client
 from francis_toolkit.types import ModelHosting
 
 logger = Logger()
 
 promotion_image_bytes = None
 
+# Average number of characters per token, to estimate the usage of generations whose usage is not reported
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
 
 class LLMBase(ABC):
     def __init__(self, region_name: str) -> None:
@@ -55,7 +65,7 @@ class RerankerBase(ABC):
 class BedrockReranker(RerankerBase):
     def __init__(self, region_name: str) -> None:
         super().__init__(region_name)
-        self.client = boto3.client("bedrock-agent-runtime", region_name=region_name)
+        self.client = get_client("bedrock-agent-runtime", region_name=region_name)
 
     def _format_documents_for_reranking(self, documents: list[dict]) -> list:
         return [
@@ -137,7 +147,7 @@ class BedrockReranker(RerankerBase):
 class BedrockLLM(LLMBase):
     def __init__(self, region_name: str) -> None:
         super().__init__(region_name)
-        self.client = boto3.client("bedrock-runtime", region_name=region_name)
+        self.client = get_client("bedrock-runtime", region_name=region_name)
 
     def call_text_llms(
         self,
@@ -220,21 +230,28 @@ class BedrockLLM(LLMBase):
             if streaming_context is not None:
                 try:
                     response = self.client.converse_stream(**converse_kwargs)
-                    for event in response["stream"]:
-                        if "contentBlockDelta" in event:
-                            content_delta_text = event["contentBlockDelta"]["delta"]["text"]
-                            stream_llm_response(
-                                streaming_context.connectionId,
-                                {
-                                    "chatId": streaming_context.chatId,
-                                    "messageId": streaming_context.messageId,
-                                    "chunks": [content_delta_text],
-                                },
-                            )
-                            inference_result += content_delta_text
-                        if "usage" in event:
-                            input_tokens = event["usage"].get("inputTokens", 0)
-                            output_tokens = event["usage"].get("outputTokens", 0)
+                    with StreamingSink(streaming_context) as sink:
+                        for event in response["stream"]:
+                            if sink.cancelled:
+                                # Nobody can read the answer anymore, stop paying for its tokens
+                                logger.info("The answer cannot be streamed anymore, stopping the generation")
+                                app_trace.add("generation_cancelled", True)
+                                response["stream"].close()
+                                # The usage is only reported by the metadata event that ends the stream, but the
+                                # prompt and the tokens generated so far are billed: record an estimate of them
+                                system_prompt = str(kwargs.get("system_prompt", ""))
+                                input_tokens = estimate_tokens(final_prompt + system_prompt)
+                                output_tokens = estimate_tokens(inference_result)
+                                app_trace.add("estimated_usage", {"inputTokens": input_tokens, "outputTokens": output_tokens})
+                                break
+                            if "contentBlockDelta" in event:
+                                content_delta_text = event["contentBlockDelta"]["delta"]["text"]
+                                sink.write(content_delta_text)
+                                inference_result += content_delta_text
+                            usage = event.get("metadata", {}).get("usage")
+                            if usage:
+                                input_tokens = usage.get("inputTokens", 0)
+                                output_tokens = usage.get("outputTokens", 0)
                 except botocore.exceptions.ClientError as err:
                     if "ContentFilterException" in str(err):
                         app_trace.add("content_filter_exception", {
@@ -275,6 +292,9 @@ class BedrockLLM(LLMBase):
             logger.debug(f"Response received from {model_config['modelId']}: {inference_result}")
             return (inference_result, input_tokens, output_tokens)
 
+        except StreamingError:
+            # The answer did not reach the client, it must not be stored as a complete turn
+            raise
         except botocore.exceptions.ClientError as err:
             if "ContentFilterException" in str(err):
                 app_trace.add("content_filter_exception", {
@@ -295,7 +315,7 @@ class BedrockLLM(LLMBase):
 class SagemakerLLM(LLMBase):
     def __init__(self, region_name: str) -> None:
         super().__init__(region_name)
-        self.client = boto3.client("sagemaker-runtime", region_name=region_name)
+        self.client = get_client("sagemaker-runtime", region_name=region_name)
 
     def call_text_llms(
         self,
@@ -329,35 +349,23 @@ class SagemakerLLM(LLMBase):
                     ContentType=content_handler.content_type,
                 )
 
-                # The streaming output text follows the pattern b'{"generated_text": "<output>"}' for Meta LlaMa 3 models
-                # Adjust the logic below as needed to accommodate the specific output format of different models.
-                response_bytes = b""
-                filter_pattern = b'{"generated_text": "'
-                content_started = False
-                for event in response["Body"]:
-                    chunk_bytes = event["PayloadPart"]["Bytes"]
-                    response_bytes += chunk_bytes
-
-                    if len(response_bytes) < len(filter_pattern):
-                        continue
-
-                    if not content_started:
-                        if response_bytes.startswith(filter_pattern):
-                            chunk_bytes = response_bytes[len(filter_pattern) :]
-                        content_started = True
-
-                    if chunk_bytes.endswith(b'"}'):
-                        chunk_bytes = chunk_bytes[:-2]
-
-                    stream_llm_response(
-                        streaming_context.connectionId,
-                        {
-                            "chatId": streaming_context.chatId,
-                            "messageId": streaming_context.messageId,
-                            "chunks": [chunk_bytes.decode("utf-8")],
-                        },
-                    )
-                text = content_handler.transform_output(response_bytes)
+                # By default the output is streamed as a single JSON document, e.g. b'{"generated_text": "<output>"}'
+                # for Meta Llama 3 models. Set the `stream_format` kwarg for models streaming token events.
+                decoder = get_stream_decoder(
+                    str(kwargs.get("stream_format", "json")), output_label=label_converter["output_label"]  # type: ignore
+                )
+                with StreamingSink(streaming_context) as sink:
+                    for event in response["Body"]:
+                        if sink.cancelled:
+                            logger.info("The answer cannot be streamed anymore, stopping the generation")
+                            app_trace.add("generation_cancelled", True)
+                            response["Body"].close()
+                            break
+                        if "PayloadPart" not in event:
+                            continue
+                        sink.write(decoder.feed(event["PayloadPart"]["Bytes"]))
+                    sink.write(decoder.finish())
+                text = decoder.text
 
             else:
                 response = self.client.invoke_endpoint(
@@ -377,23 +385,44 @@ class SagemakerLLM(LLMBase):
         return text
 
 
+# The model classes only hold a client and a region, so one instance per provider and region is shared
+_instances: Dict[Tuple[str, str, Optional[str]], object] = {}
+_instances_lock = threading.Lock()
+
+
+def _get_instance(kind: str, provider: str, region_name: Optional[str], factory: type) -> object:
+    key = (kind, provider, region_name)
+    instance = _instances.get(key)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory(region_name=region_name)
+                _instances[key] = instance
+    return instance
+
+
 def get_llm_class(provider: str, region_name: Optional[str] = None) -> LLMBase:
     region_name = region_name or os.getenv("AWS_DEFAULT_REGION")
 
     if provider == ModelHosting.BEDROCK:
-        llm_class = BedrockLLM(region_name=region_name)  # type: ignore
+        return _get_instance("llm", ModelHosting.BEDROCK.value, region_name, BedrockLLM)  # type: ignore
     else:
-        llm_class = SagemakerLLM(region_name=region_name)  # type: ignore
-
-    return llm_class
+        return _get_instance("llm", ModelHosting.SAGEMAKER.value, region_name, SagemakerLLM)  # type: ignore
 
 def get_reranker_class(provider: str, region_name: Optional[str] = None) -> RerankerBase:
     region_name = region_name or os.getenv("AWS_DEFAULT_REGION")
 
     if provider == ModelHosting.BEDROCK:
-        reranker_class = BedrockReranker(region_name=region_name)  # type: ignore
+        return _get_instance("reranker", ModelHosting.BEDROCK.value, region_name, BedrockReranker)  # type: ignore
     else:
         # No current implementation for non-bedrock rerankers
         raise ValueError(f"Unsupported reranker provider: %s", provider)
 
-    return reranker_class
+
+def warm_up_model_clients(providers: Tuple[str, ...] = (ModelHosting.BEDROCK.value,), rerank: bool = False) -> None:
+    """Create the model clients ahead of the first request, e.g. during the init phase."""
+    for provider in providers:
+        get_llm_class(provider)
+    if rerank:
+        get_reranker_class(ModelHosting.BEDROCK.value)
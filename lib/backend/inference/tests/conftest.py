@@ -0,0 +1,9 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import os
+import sys
+
+# The handler modules import each other from the function directory, and the toolkit from its layer
+FUNCTION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TOOLKIT_DIR = os.path.abspath(os.path.join(FUNCTION_DIR, "..", "layers", "toolkit-layer", "python"))
+sys.path[:0] = [FUNCTION_DIR, TOOLKIT_DIR]
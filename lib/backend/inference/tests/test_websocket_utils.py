@@ -0,0 +1,51 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import time
+from typing import Any, List
+
+import pytest
+from common import websocket_utils
+from common.types import StreamingContext
+from common.websocket_utils import StreamingSink
+
+FLUSH_INTERVAL_MS = 30
+
+
+@pytest.fixture
+def posts(mocker: Any) -> List[dict]:
+    """Record the payloads posted to the client, instead of sending them."""
+    posted: List[dict] = []
+
+    def stream_llm_response(connection_id: str, input_data: dict) -> None:
+        posted.append({"at": time.monotonic(), **input_data})
+
+    mocker.patch.object(websocket_utils, "stream_llm_response", side_effect=stream_llm_response)
+    mocker.patch.object(websocket_utils.app_trace, "add")
+    return posted
+
+
+def test_short_chunk_is_posted_within_flush_interval(posts: List[dict]) -> None:
+    context = StreamingContext(chatId="chat", messageId="message", connectionId="connection")
+    with StreamingSink(context, flush_interval_ms=FLUSH_INTERVAL_MS, flush_size=200) as sink:
+        written_at = time.monotonic()
+        sink.write("Hi")
+        # The sink stays open, so only the flush interval can send the chunk
+        deadline = written_at + 10 * FLUSH_INTERVAL_MS / 1000
+        while not posts and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        assert [post["chunks"] for post in posts] == [["Hi"]]
+        assert posts[0]["at"] - written_at < 5 * FLUSH_INTERVAL_MS / 1000
+
+    assert len(posts) == 1
+
+
+def test_full_buffer_is_posted_without_waiting(posts: List[dict]) -> None:
+    context = StreamingContext(chatId="chat", messageId="message", connectionId="connection")
+    with StreamingSink(context, flush_interval_ms=60_000, flush_size=4) as sink:
+        sink.write("Hello")
+        deadline = time.monotonic() + 1
+        while not posts and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        assert [post["chunks"] for post in posts] == [["Hello"]]
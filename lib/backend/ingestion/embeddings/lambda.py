@@ -1,18 +1,20 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
+import codecs
 import csv
-import io
 import json
 import os
 import time
-from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
 
-import boto3
 from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
+from francis_toolkit.clients import get_client, get_resource
+from francis_toolkit.pgvector.vectorstores import PGVector
 from francis_toolkit.utils import find_embedding_model_by_ref_key, get_vector_store
-from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pydantic import BaseModel
 
@@ -24,6 +26,10 @@ metrics = Metrics(namespace=os.getenv("METRICS_NAMESPACE"))
 CHUNK_SIZE_DOC_SPLIT = int(os.getenv("CHUNK_SIZE_DOC_SPLIT", 1000))
 OVERLAP_FOR_DOC_SPLIT = int(os.getenv("OVERLAP_FOR_DOC_SPLIT", 200))
 CONCAT_CSV_ROWS = os.getenv("CONCAT_CSV_ROWS", "false").lower() == "true"
+# Size of the ranges the files are read in from S3, and number of chunks embedded and stored at a time.
+# Together with the chunk size, they bound the memory used by the ingestion of a file.
+S3_READ_RANGE_BYTES = int(os.getenv("S3_READ_RANGE_BYTES", 8 * 1024 * 1024))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
 
 
 class FileEmbeddingsRequest(BaseModel):
@@ -46,7 +52,7 @@ def read_from_s3(bucket_name: str, object_key: str) -> bytes:
     Raises:
     Exception: If there's an error reading the file.
     """
-    s3_client = boto3.client("s3")
+    s3_client = get_client("s3")
 
     try:
         response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
@@ -68,26 +74,130 @@ def load_metadata(bucket_name: str, object_key: str) -> dict:
         return metadata
 
 
-def process_text_embeddings(content: str) -> List[Document]:
-    return [Document(page_content=content)]
+def iter_s3_ranges(bucket_name: str, object_key: str, range_size: int = S3_READ_RANGE_BYTES) -> Iterator[bytes]:
+    """Read an S3 object in consecutive byte ranges, fetching the next range while the current one is processed.
 
+    The ranges are read with the ETag of the object, so that they all come from the same version of it.
+    """
+    s3_client = get_client("s3")
+
+    def read_range(start: int, end: int) -> bytes:
+        response = s3_client.get_object(Bucket=bucket_name, Key=object_key, Range=f"bytes={start}-{end}", IfMatch=etag)
+        return response["Body"].read()
+
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+        size, etag = head["ContentLength"], head["ETag"]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_range: Optional[Future] = executor.submit(read_range, 0, range_size - 1) if size else None
+            for start in range(0, size, range_size):
+                content = next_range.result()  # type: ignore
+                next_start = start + range_size
+                next_range = executor.submit(read_range, next_start, next_start + range_size - 1) if next_start < size else None
+                yield content
+    except ClientError as e:
+        raise Exception(f"An unexpected error occurred: {str(e)}")  # noqa: B904
 
-def process_csv_embeddings(content: str) -> List[Document]:
-    csv_stream = io.StringIO(content)
 
-    # Create a CSV reader object from the BytesIO object
-    csv_reader = csv.DictReader(csv_stream)
-    text_list = []
+def iter_text(byte_ranges: Iterable[bytes]) -> Iterator[str]:
+    """Decode UTF-8 byte ranges, whose boundaries may fall in the middle of a character."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for content in byte_ranges:
+        text = decoder.decode(content)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
 
-    for row in csv_reader:
-        text_list.append("\n".join([f"{key}: {value}" for key, value in row.items()]))
 
-    if CONCAT_CSV_ROWS:
-        documents = [Document(page_content="\n".join(text_list))]
+def iter_lines(text_stream: Iterable[str]) -> Iterator[str]:
+    """Split a text stream into lines, keeping their line endings as the csv module expects."""
+    pending = ""
+    for text in text_stream:
+        lines = (pending + text).split("\n")
+        # The last line may continue in the next range
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+def iter_csv_rows(text_stream: Iterable[str]) -> Iterator[str]:
+    for row in csv.DictReader(iter_lines(text_stream)):
+        yield "\n".join([f"{key}: {value}" for key, value in row.items()])
+
+
+def split_text_stream(
+    text_stream: Iterable[str], text_splitter: RecursiveCharacterTextSplitter, window_size: int
+) -> Iterator[str]:
+    """Split a text that is too large to be held in memory into chunks.
+
+    The text is buffered until it reaches `window_size` characters, the buffer is split, and the last
+    chunk is kept as the start of the next buffer, so chunks never end at a buffer boundary.
+    """
+    buffer = ""
+    for text in text_stream:
+        buffer += text
+        if len(buffer) < window_size:
+            continue
+        chunks = text_splitter.split_text(buffer)
+        if len(chunks) > 1:
+            yield from chunks[:-1]
+            buffer = chunks[-1]
+    if buffer.strip():
+        yield from text_splitter.split_text(buffer)
+
+
+def iter_chunks(text_stream: Iterable[str], content_type: str, text_splitter: RecursiveCharacterTextSplitter) -> Iterator[str]:
+    window_size = 10 * CHUNK_SIZE_DOC_SPLIT
+    if content_type == "text/plain":
+        yield from split_text_stream(text_stream, text_splitter, window_size)
+    elif CONCAT_CSV_ROWS:
+        rows = iter_csv_rows(text_stream)
+        yield from split_text_stream((row + "\n" for row in rows), text_splitter, window_size)
     else:
-        documents = [Document(page_content=text) for text in text_list]
+        # Each row is a document of its own
+        for row in iter_csv_rows(text_stream):
+            yield from text_splitter.split_text(row)
+
+
+def batched(iterable: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
-    return documents
+
+def ingest_chunks(vector_store: PGVector, chunks: Iterable[str], metadata: dict, file_uri: str) -> int:
+    """Embed and store the chunks of a file in micro-batches, then make them replace the file's previous chunks.
+
+    A batch is stored while the next one is embedded. The batches are written as pending, so that the
+    file is not searchable half-ingested, and replace the previous chunks in a single transaction at the end.
+    """
+    vector_store.begin_document_replacement(file_uri)
+
+    embeddings_generated = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending_write: Optional[Future] = None
+        for texts in batched(chunks, EMBEDDING_BATCH_SIZE):
+            embeddings = vector_store.embeddings.embed_documents(texts)
+            if pending_write is not None:
+                pending_write.result()
+            pending_write = executor.submit(
+                vector_store.add_embeddings,
+                texts=texts,
+                embeddings=embeddings,
+                metadatas=[dict(metadata) for _ in texts],
+                document_source_uri=file_uri,
+                pending=True,
+            )
+            embeddings_generated += len(texts)
+        if pending_write is not None:
+            pending_write.result()
+
+    vector_store.commit_document_replacement(file_uri)
+    return embeddings_generated
 
 
 def update_ingested_time(file_uri: str) -> bool:
@@ -96,7 +206,7 @@ def update_ingested_time(file_uri: str) -> bool:
 
     :return: True if update was successful, False otherwise
     """
-    dynamodb = boto3.resource("dynamodb")
+    dynamodb = get_resource("dynamodb")
     table = dynamodb.Table(os.getenv("CACHE_TABLE_NAME"))
 
     current_time = int(time.time())  # Current time in Unix timestamp format
@@ -134,9 +244,6 @@ def handler(event: dict, context: LambdaContext) -> dict:
         raise ValueError(f"Embedding model {request.model_ref_key} not found")
 
     bucket_name, object_key = file_uri.replace("s3://", "").split("/", 1)
-    raw_content = read_from_s3(bucket_name, object_key)
-
-    documents = []
     metadata = load_metadata(bucket_name, object_key)
 
     # add additional metadata
@@ -144,13 +251,7 @@ def handler(event: dict, context: LambdaContext) -> dict:
     metadata["create_timestamp"] = int(time.time() * 1000)
     metadata["embeddings_model_id"] = embedding_model.modelId
 
-    if content_type == "text/plain":
-        documents = process_text_embeddings(raw_content.decode("utf-8"))
-
-    elif content_type in ["text/csv", "application/csv"]:
-        documents = process_csv_embeddings(raw_content.decode("utf-8"))
-
-    else:
+    if content_type not in ["text/plain", "text/csv", "application/csv"]:
         # This shouldn't occur since unsupported types are filtered out in the ingestion pipeline.
         # Treat this as a fallback case.
         logger.debug(f"Unsupported content type: {content_type} for {file_uri}")
@@ -164,12 +265,13 @@ def handler(event: dict, context: LambdaContext) -> dict:
         length_function=len,
     )
 
-    chunks = text_splitter.create_documents([doc.page_content for doc in documents], metadatas=[metadata for _ in documents])
+    text_stream = iter_text(iter_s3_ranges(bucket_name, object_key))
+    chunks = iter_chunks(text_stream, content_type, text_splitter)
 
     # don't create tables in the ingesiton pipeline as it may lead to race condition due to Map iterations
     vector_store = get_vector_store(embedding_model)
-    embeddings = vector_store.add_documents(documents=chunks, document_source_uri=file_uri)
+    embeddings_generated = ingest_chunks(vector_store, chunks, metadata, file_uri)
 
     update_ingested_time(file_uri)
 
-    return {"FileURI": file_uri, "EmbeddingsGenerated": len(embeddings)}
+    return {"FileURI": file_uri, "EmbeddingsGenerated": embeddings_generated}
@@ -15,6 +15,8 @@ metrics = Metrics(namespace=os.getenv("METRICS_NAMESPACE"))
 
 class VectorStoreMgmtRequest(BaseModel):
     purge_data: Optional[bool] = False
+    purge_inactive: Optional[bool] = True
+    rebuild_index: Optional[bool] = False
     model_ref_key: Optional[str] = None
 
 
@@ -34,3 +36,12 @@ def handler(event: dict, context: LambdaContext) -> None:
         logger.info("Purging vector store")
         vector_store.delete_collection()
         vector_store.create_collection()
+    elif request.purge_inactive:
+        # Delete the chunks replaced by previous ingestions, keeping time to build the index below.
+        # Rows left over are deleted by the next run.
+        max_duration = max(0.0, context.get_remaining_time_in_millis() / 1000 / 2)
+        vector_store.purge_inactive(max_duration=max_duration)
+
+    # Creates the index of a new collection, or rebuilds it on request (e.g. after a large ingestion
+    # into an IVFFlat index, whose lists are computed from the rows present at build time)
+    vector_store.create_vector_index(rebuild=bool(request.rebuild_index))
@@ -0,0 +1,290 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import sqlalchemy
+from aws_lambda_powertools import Logger
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from .database import get_engine
+from .pgvector.vectorstores import (
+    DEFAULT_DISTANCE_STRATEGY,
+    DistanceStrategy,
+    _get_answer_cache_store,
+    _get_embedding_collection_store,
+)
+
+logger = Logger()
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class CachedAnswer(BaseModel):
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]] = []
+    similarity: float
+
+
+def _to_json(sources: List[Any]) -> List[Dict[str, Any]]:
+    # Documents may carry values (dates, decimals) that the JSONB column cannot store as is
+    return json.loads(json.dumps(sources, default=str))
+
+
+class BaseAnswerCache(ABC):
+    """Answers of previous questions, looked up by the similarity of the question embeddings.
+
+    Entries are grouped by collection (the corpus the answers were computed from), so that they can
+    be invalidated when the corpus changes.
+    """
+
+    def __init__(self, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def lookup(self, collection_name: str, embedding: List[float]) -> Optional[CachedAnswer]:
+        """Return the answer of the most similar cached question, if it is similar enough and not expired."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def put(self, collection_name: str, question: str, embedding: List[float], answer: str, sources: List[Any]) -> None:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def invalidate(self, collection_name: str) -> None:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+
+class PGVectorAnswerCache(BaseAnswerCache):
+    """Answer cache stored next to the corpus, in the `pg_answer_cache` table.
+
+    Ingestion deletes the entries of a collection in the same transaction that replaces its
+    documents, and deleting a collection cascades to its entries, so hits never outlive the
+    documents they were computed from.
+    """
+
+    def __init__(
+        self,
+        connection: Optional[sqlalchemy.engine.Engine] = None,
+        distance_strategy: DistanceStrategy = DEFAULT_DISTANCE_STRATEGY,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    ):
+        super().__init__(similarity_threshold=similarity_threshold, ttl_seconds=ttl_seconds)
+        self._engine = connection or get_engine()
+        self._session_maker = sessionmaker(bind=self._engine)
+        self._distance_strategy = distance_strategy
+        self.EmbeddingStore, self.CollectionStore = _get_embedding_collection_store()
+        self.AnswerCacheStore = _get_answer_cache_store()
+        self._collection_ids: Dict[str, Any] = {}
+        self._table_created = False
+
+    def _ensure_table(self) -> None:
+        if not self._table_created:
+            self.AnswerCacheStore.__table__.create(self._engine, checkfirst=True)
+            self._table_created = True
+
+    def _get_collection_id(self, session: Any, collection_name: str) -> Any:
+        if collection_name not in self._collection_ids:
+            collection = self.CollectionStore.get_by_name(session, collection_name)
+            if collection is None:
+                return None
+            self._collection_ids[collection_name] = collection.uuid
+        return self._collection_ids[collection_name]
+
+    def _distance(self, embedding: List[float]) -> Any:
+        column = self.AnswerCacheStore.embedding
+        if self._distance_strategy == DistanceStrategy.EUCLIDEAN:
+            return column.l2_distance(embedding)
+        elif self._distance_strategy == DistanceStrategy.COSINE:
+            return column.cosine_distance(embedding)
+        elif self._distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            return column.max_inner_product(embedding)
+        raise ValueError(f"Got unexpected value for distance: {self._distance_strategy}.")
+
+    def _max_distance(self) -> float:
+        """Translate the similarity threshold into a distance, assuming unit-normed embeddings."""
+        if self._distance_strategy == DistanceStrategy.EUCLIDEAN:
+            return math.sqrt(max(0.0, 2 - 2 * self.similarity_threshold))
+        elif self._distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            # pgvector returns the negative inner product
+            return -self.similarity_threshold
+        return 1 - self.similarity_threshold
+
+    def _similarity(self, distance: float) -> float:
+        if self._distance_strategy == DistanceStrategy.EUCLIDEAN:
+            return 1 - distance**2 / 2
+        elif self._distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            return -distance
+        return 1 - distance
+
+    def lookup(self, collection_name: str, embedding: List[float]) -> Optional[CachedAnswer]:
+        self._ensure_table()
+        with self._session_maker() as session:
+            collection_id = self._get_collection_id(session, collection_name)
+            if collection_id is None:
+                return None
+
+            distance = self._distance(embedding).label("distance")
+            not_before = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+            row = session.execute(
+                select(
+                    self.AnswerCacheStore.question,
+                    self.AnswerCacheStore.answer,
+                    self.AnswerCacheStore.sources,
+                    distance,
+                )
+                .where(
+                    self.AnswerCacheStore.collection_id == collection_id,
+                    self.AnswerCacheStore.created_at >= not_before,
+                    distance <= self._max_distance(),
+                )
+                .order_by(distance)
+                .limit(1)
+            ).first()
+
+        if row is None:
+            return None
+
+        return CachedAnswer(
+            question=row.question, answer=row.answer, sources=row.sources or [], similarity=self._similarity(row.distance)
+        )
+
+    def put(self, collection_name: str, question: str, embedding: List[float], answer: str, sources: List[Any]) -> None:
+        self._ensure_table()
+        with self._session_maker() as session:
+            collection_id = self._get_collection_id(session, collection_name)
+            if collection_id is None:
+                return
+
+            # Expired entries are never returned, they are cleaned up here to keep the table small
+            not_before = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+            session.execute(
+                delete(self.AnswerCacheStore).where(
+                    self.AnswerCacheStore.collection_id == collection_id, self.AnswerCacheStore.created_at < not_before
+                )
+            )
+            session.execute(
+                insert(self.AnswerCacheStore).values(
+                    collection_id=collection_id,
+                    embedding=embedding,
+                    question=question,
+                    answer=answer,
+                    sources=_to_json(sources),
+                )
+            )
+            try:
+                session.commit()
+            except sqlalchemy.exc.IntegrityError:
+                # The collection was deleted (and maybe recreated) since its ID was cached
+                self._collection_ids.pop(collection_name, None)
+                logger.warning(f"Collection {collection_name} no longer exists, the answer was not cached")
+
+    def invalidate(self, collection_name: str) -> None:
+        self._ensure_table()
+        with self._session_maker() as session:
+            collection_id = self._get_collection_id(session, collection_name)
+            if collection_id is None:
+                return
+            session.execute(delete(self.AnswerCacheStore).where(self.AnswerCacheStore.collection_id == collection_id))
+            session.commit()
+
+
+class InMemoryAnswerCache(BaseAnswerCache):
+    """Answer cache local to the execution environment, searched with cosine similarity.
+
+    The cache cannot see ingestion in other processes: entries are only dropped by their TTL, by
+    `invalidate`, or when the cache is full. Use a short TTL with this backend.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        super().__init__(similarity_threshold=similarity_threshold, ttl_seconds=ttl_seconds)
+        self.max_entries = max_entries
+        # collection name -> entries in insertion order, as (unit embedding, expiry, answer)
+        self._entries: Dict[str, "OrderedDict[int, Tuple[np.ndarray, float, CachedAnswer]]"] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, collection_name: str, embedding: List[float]) -> Optional[CachedAnswer]:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.get(collection_name)
+            if not entries:
+                return None
+
+            for entry_id in [entry_id for entry_id, (_, expires_at, _) in entries.items() if expires_at <= now]:
+                del entries[entry_id]
+            if not entries:
+                return None
+
+            ids = list(entries)
+            matrix = np.stack([entries[entry_id][0] for entry_id in ids])
+            similarities = matrix @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            cached = entries[ids[best]][2]
+            return cached.model_copy(update={"similarity": float(similarities[best])})
+
+    def put(self, collection_name: str, question: str, embedding: List[float], answer: str, sources: List[Any]) -> None:
+        cached = CachedAnswer(question=question, answer=answer, sources=_to_json(sources), similarity=1.0)
+        with self._lock:
+            entries = self._entries.setdefault(collection_name, OrderedDict())
+            entries[self._next_id] = (self._normalize(embedding), time.monotonic() + self.ttl_seconds, cached)
+            self._next_id += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, collection_name: str) -> None:
+        with self._lock:
+            self._entries.pop(collection_name, None)
+
+
+_answer_caches: Dict[Tuple[Any, ...], BaseAnswerCache] = {}
+
+
+def get_answer_cache(answer_cache_config: dict) -> BaseAnswerCache:
+    """Return the answer cache described by the `answerCacheConfig` section of the LLM configuration."""
+    backend = answer_cache_config.get("backend", "pgvector")
+    similarity_threshold = float(answer_cache_config.get("similarityThreshold", DEFAULT_SIMILARITY_THRESHOLD))
+    ttl_seconds = int(answer_cache_config.get("ttlSeconds", DEFAULT_TTL_SECONDS))
+
+    key = (backend, similarity_threshold, ttl_seconds)
+    if key not in _answer_caches:
+        if backend == "pgvector":
+            _answer_caches[key] = PGVectorAnswerCache(similarity_threshold=similarity_threshold, ttl_seconds=ttl_seconds)
+        elif backend == "memory":
+            _answer_caches[key] = InMemoryAnswerCache(
+                similarity_threshold=similarity_threshold,
+                ttl_seconds=ttl_seconds,
+                max_entries=int(answer_cache_config.get("maxEntries", DEFAULT_MAX_ENTRIES)),
+            )
+        else:
+            raise ValueError(f"Invalid answer cache backend: {backend}")
+    return _answer_caches[key]
+
@@ -1,20 +1,82 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-import boto3
+"""Process-wide boto3 clients.
+
+Clients are created on first use rather than at import, so a Lambda function only pays for the
+clients its requests actually need. The module attributes (`s3_client`, `dynamodb_resource_client`, ...)
+are kept for compatibility and resolve to the cached clients when first accessed.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
 from botocore.config import Config
 
-sagemaker_client = boto3.client("sagemaker-runtime", config=Config(retries={"max_attempts": 15, "mode": "adaptive"}))
+SAGEMAKER_CLIENT_CONFIG = Config(retries={"max_attempts": 15, "mode": "adaptive"})
+
+_clients: Dict[Tuple[str, str, Optional[str], Optional[str], Optional[int]], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(
+    kind: str, service_name: str, region_name: Optional[str], endpoint_url: Optional[str], config: Optional[Config]
+) -> Any:
+    key = (kind, service_name, region_name, endpoint_url, id(config) if config is not None else None)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                # boto3 takes a noticeable share of the cold start, so it is only imported with the first client
+                import boto3
+
+                factory = boto3.client if kind == "client" else boto3.resource
+                client = factory(service_name, region_name=region_name, endpoint_url=endpoint_url, config=config)
+                _clients[key] = client
+    return client
+
+
+def get_client(
+    service_name: str, region_name: Optional[str] = None, config: Optional[Config] = None, endpoint_url: Optional[str] = None
+) -> Any:
+    """Return the process-wide boto3 client of a service and region, creating it on first use.
+
+    Creating a client loads the service model and starts a new connection pool, so clients are kept for
+    the lifetime of the execution environment and warm invocations reuse their open connections.
+    boto3 clients are thread-safe once created, but creating them from the default session is not.
+
+    Args:
+    ----
+        service_name (str): Name of the AWS service, e.g. `bedrock-runtime`.
+        region_name (str, optional): Defaults to the region of the execution environment.
+        config (Config, optional): Client configuration, clients with different configurations are cached separately.
+        endpoint_url (str, optional): Endpoint of the service, e.g. the callback URL of a WebSocket API.
+    """
+    return _get_or_create("client", service_name, region_name, endpoint_url, config)
+
 
-secrets_manager_client = boto3.client("secretsmanager")
+def get_resource(service_name: str, region_name: Optional[str] = None, config: Optional[Config] = None) -> Any:
+    """Return the process-wide boto3 resource of a service and region, creating it on first use."""
+    return _get_or_create("resource", service_name, region_name, None, config)
 
-s3_client = boto3.client("s3")
 
-bedrock_client = boto3.client("bedrock-runtime")
+_NAMED_CLIENTS: Dict[str, Callable[[], Any]] = {
+    "sagemaker_client": lambda: get_client("sagemaker-runtime", config=SAGEMAKER_CLIENT_CONFIG),
+    "secrets_manager_client": lambda: get_client("secretsmanager"),
+    "s3_client": lambda: get_client("s3"),
+    "bedrock_client": lambda: get_client("bedrock-runtime"),
+    "bedrock_agent_client": lambda: get_client("bedrock-agent-runtime"),
+    "dynamodb_resource_client": lambda: get_resource("dynamodb"),
+    "dynamodb_client": lambda: get_client("dynamodb"),
+    "lambda_client": lambda: get_client("lambda"),
+}
 
-bedrock_agent_client = boto3.client("bedrock-agent-runtime")
 
-dynamodb_resource_client = boto3.resource("dynamodb")
+def __getattr__(name: str) -> Any:
+    factory = _NAMED_CLIENTS.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
 
-dynamodb_client = boto3.client("dynamodb")
 
-lambda_client = boto3.client("lambda")
+def __dir__() -> Any:
+    return sorted([*globals(), *_NAMED_CLIENTS])
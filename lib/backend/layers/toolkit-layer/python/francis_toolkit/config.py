@@ -0,0 +1,138 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import botocore
+from aws_lambda_powertools import Logger
+from pydantic import BaseModel
+
+from .clients import get_resource
+from .utils import load_config_from_dynamodb
+
+logger = Logger()
+
+SYSTEM_CONFIGURATION_KEY = "system_configuration"
+
+# Seconds a loaded configuration is served from memory before it is checked again
+CONFIG_CACHE_TTL = int(os.getenv("CONFIG_CACHE_TTL", "60"))
+
+
+class SystemConfig(BaseModel):
+    """Validated system configuration, as stored in the config table.
+
+    The configuration is shared by every request of the execution environment and must not be mutated.
+    """
+
+    llmConfig: Dict[str, Any]
+    ragConfig: Dict[str, Any]
+    chatHistoryConfig: Dict[str, Any] = {}
+    handoffConfig: Optional[Dict[str, Any]] = None
+    version: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+    @property
+    def corpus_config(self) -> Dict[str, Any]:
+        return self.ragConfig.get("corpusConfig") or {}
+
+    @property
+    def corpus_type(self) -> str:
+        return self.corpus_config.get("corpusType", "default")
+
+    @property
+    def chat_history_store_type(self) -> Optional[str]:
+        return self.chatHistoryConfig.get("storeType")
+
+
+class ConfigCache:
+    """Serves a configuration item from memory and re-reads it from DynamoDB once its TTL has expired.
+
+    When the item has a `version` attribute, an expired entry is revalidated by reading only that
+    attribute, and the full item is fetched and validated again only if the version changed.
+    Callbacks registered with `subscribe` are called with the new configuration when it changes.
+    """
+
+    def __init__(self, table_name: str, config_key: str = SYSTEM_CONFIGURATION_KEY, ttl: int = CONFIG_CACHE_TTL) -> None:
+        self.table_name = table_name
+        self.config_key = config_key
+        self.ttl = ttl
+        self._table = get_resource("dynamodb").Table(table_name)
+        self._config: Optional[SystemConfig] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[SystemConfig], None]] = []
+
+    def subscribe(self, callback: Callable[[SystemConfig], None]) -> None:
+        self._callbacks.append(callback)
+
+    def get(self, force_refresh: bool = False) -> SystemConfig:
+        config = self._config
+        if config is not None and not force_refresh and time.monotonic() - self._loaded_at < self.ttl:
+            return config
+
+        with self._lock:
+            # Another thread may have refreshed the entry while we were waiting for the lock
+            if self._config is not None and not force_refresh and time.monotonic() - self._loaded_at < self.ttl:
+                return self._config
+
+            previous = self._config
+            if previous is not None and previous.version is not None and not force_refresh:
+                if self._fetch_version() == previous.version:
+                    self._loaded_at = time.monotonic()
+                    return previous
+
+            config = self._fetch()
+            self._config = config
+            self._loaded_at = time.monotonic()
+
+        if previous is not None and config != previous:
+            logger.info(f"Configuration '{self.config_key}' changed", extra={"version": config.version})
+            for callback in self._callbacks:
+                try:
+                    callback(config)
+                except Exception:
+                    logger.exception("Configuration change callback failed")
+
+        return config
+
+    def _fetch_version(self) -> Optional[str]:
+        try:
+            response = self._table.get_item(
+                Key={"PK": self.config_key},
+                ProjectionExpression="#version",
+                ExpressionAttributeNames={"#version": "version"},
+            )
+        except botocore.exceptions.ClientError as e:
+            logger.warning(f"Error checking the configuration version: {e.response['Error']['Message']}")
+            return None
+
+        version = response.get("Item", {}).get("version")
+        return str(version) if version is not None else None
+
+    def _fetch(self) -> SystemConfig:
+        item = load_config_from_dynamodb(self.table_name, self.config_key)
+        if item is None:
+            raise ValueError(f"Failed to load configuration '{self.config_key}' from DynamoDB table '{self.table_name}'")
+
+        if item.get("version") is not None:
+            item["version"] = str(item["version"])
+        return SystemConfig(**item)
+
+
+_config_caches: Dict[str, ConfigCache] = {}
+
+
+def get_config_cache(table_name: Optional[str] = None) -> ConfigCache:
+    table_name = table_name or os.getenv("CONFIG_TABLE_NAME", "")
+    if table_name not in _config_caches:
+        _config_caches[table_name] = ConfigCache(table_name)
+    return _config_caches[table_name]
+
+
+def get_system_config(force_refresh: bool = False) -> SystemConfig:
+    """Return the system configuration of the `CONFIG_TABLE_NAME` table."""
+    return get_config_cache().get(force_refresh=force_refresh)
@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import botocore
+
+from .clients import get_client
+
+if TYPE_CHECKING:
+    import sqlalchemy
+
+# Seconds the RDS secret is cached for. A rotated password is picked up at most this long after rotation.
+RDS_SECRET_CACHE_TTL = int(os.getenv("RDS_SECRET_CACHE_TTL", "300"))
+
+# A Lambda execution environment serves one request at a time, so a small pool is enough. The
+# overflow covers the threads that query the database concurrently within a request.
+DEFAULT_ENGINE_ARGS: Dict[str, Any] = {
+    "pool_size": int(os.getenv("RDS_POOL_SIZE", "2")),
+    "max_overflow": int(os.getenv("RDS_POOL_MAX_OVERFLOW", "4")),
+    # Connections idle across frozen invocations may have been closed by the server
+    "pool_pre_ping": True,
+    "pool_recycle": int(os.getenv("RDS_POOL_RECYCLE", "900")),
+}
+
+_cached_connection_string: Optional[Tuple[str, float]] = None
+_engines: Dict[str, "sqlalchemy.engine.Engine"] = {}
+_lock = threading.Lock()
+
+
+def _fetch_rds_connection_string() -> str:
+    try:
+        get_secret_value_response = get_client("secretsmanager").get_secret_value(SecretId=os.getenv("RDS_SECRET_ARN"))
+    except botocore.exceptions.ClientError as e:
+        raise Exception(f"Error retrieving secret: {e.response['Error']['Code']}")  # noqa: B904
+
+    secret = get_secret_value_response["SecretString"]
+    secret_dict = json.loads(secret)
+
+    host = os.getenv("RDS_ENDPOINT")
+    port = secret_dict["port"]
+    db_name = secret_dict["dbname"]
+    username = secret_dict["username"]
+    password = secret_dict["password"]
+
+    return f"postgresql+pg8000://{username}:{password}@{host}:{port}/{db_name}"
+
+
+def get_rds_connection_string(force_refresh: bool = False) -> str:
+    """Return the connection string of the RDS database, read from Secrets Manager at most once per TTL.
+
+    When the secret has been rotated, the engine built for the previous connection string is disposed.
+    """
+    global _cached_connection_string
+
+    with _lock:
+        if _cached_connection_string is not None and not force_refresh:
+            connection_string, fetched_at = _cached_connection_string
+            if time.monotonic() - fetched_at < RDS_SECRET_CACHE_TTL:
+                return connection_string
+
+        connection_string = _fetch_rds_connection_string()
+
+        if _cached_connection_string is not None and _cached_connection_string[0] != connection_string:
+            stale_engine = _engines.pop(_cached_connection_string[0], None)
+            if stale_engine is not None:
+                stale_engine.dispose()
+
+        _cached_connection_string = (connection_string, time.monotonic())
+        return connection_string
+
+
+def get_engine(connection_string: Optional[str] = None, **engine_args: Any) -> "sqlalchemy.engine.Engine":
+    """Return the process-wide engine of a connection string, creating it on first use.
+
+    The engine and its connection pool are kept for the lifetime of the execution environment, so
+    warm invocations reuse open connections instead of paying for a new TLS handshake.
+
+    Args:
+    ----
+        connection_string (str, optional): Defaults to the connection string of the RDS database.
+        engine_args: Overrides of the default `sqlalchemy.create_engine` arguments, used when the engine is created.
+    """
+    # Imported on first use, as only the functions that query the database need SQLAlchemy
+    import sqlalchemy
+
+    if connection_string is None:
+        connection_string = get_rds_connection_string()
+
+    with _lock:
+        engine = _engines.get(connection_string)
+        if engine is None:
+            engine = sqlalchemy.create_engine(url=connection_string, **{**DEFAULT_ENGINE_ARGS, **engine_args})
+            _engines[connection_string] = engine
+        return engine
@@ -1,15 +1,27 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
-import asyncio
 import json
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
+import botocore
 import numpy as np
+from aws_lambda_powertools import Logger
 from langchain_core.embeddings import Embeddings
 from pydantic import BaseModel, ConfigDict
 from langchain_core.runnables.config import run_in_executor
 
+logger = Logger()
+
+# Largest number of texts Cohere embedding models accept in one request
+COHERE_MAX_BATCH_SIZE = 96
+
+# Error codes returned when Bedrock is overloaded, worth retrying after a delay
+RETRYABLE_ERROR_CODES = {"ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException"}
+
 
 class BedrockEmbeddings(BaseModel, Embeddings):
 
@@ -41,44 +53,68 @@ class BedrockEmbeddings(BaseModel, Embeddings):
     normalize: bool = False
     """Whether the embeddings should be normalized to unit vectors"""
 
+    max_concurrency: int = int(os.getenv("BEDROCK_EMBEDDING_CONCURRENCY", "8"))
+    """Maximum number of concurrent requests sent by `embed_documents`"""
+
+    max_retries: int = 6
+    """Number of times a throttled request is retried before giving up"""
+
+    backoff_base: float = 0.5
+    """Delay in seconds before the first retry of a throttled request, doubled on every retry"""
+
     model_config = ConfigDict(
         arbitrary_types_allowed=True, extra="forbid", protected_namespaces=()
     )
 
     def _embedding_func(self, text: str, **kwargs: Any) -> List[float]:
         """Call out to Bedrock embedding endpoint."""
+        return self._embed_batch([text], **kwargs)[0]
+
+    def _embed_batch(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        """Embed texts in a single request, or one text at a time for models without a batch API."""
         # replace newlines, which can negatively affect performance.
-        text = text.replace(os.linesep, " ")
+        texts = [text.replace(os.linesep, " ") for text in texts]
 
         # format input body for provider
         _model_kwargs = self.model_kwargs or {}
         input_body = {**_model_kwargs}
         if self.model_provider == "cohere":
             input_body["input_type"] = kwargs.get("input_type") or input_body.get("input_type") or "search_document"
-            input_body["texts"] = [text]
-        else:
-            # includes common provider == "amazon"
-            input_body["inputText"] = text
-        body = json.dumps(input_body)
+            input_body["texts"] = texts
+            response_body = self._invoke(input_body)
+            return response_body.get("embeddings")  # type: ignore
 
-        try:
-            # invoke bedrock API
-            response = self.client.invoke_model(
-                body=body,
-                modelId=self.model_id,
-                accept="application/json",
-                contentType="application/json",
-            )
-
-            # format output based on provider
-            response_body = json.loads(response.get("body").read())
-            if self.model_provider == "cohere":
-                return response_body.get("embeddings")[0]  # type: ignore
-            else:
-                # includes common provider == "amazon"
-                return response_body.get("embedding")  # type: ignore
-        except Exception as e:
-            raise ValueError(f"Error raised by inference endpoint: {e}")  # noqa: B904
+        # includes common provider == "amazon", which embeds one text per request
+        embeddings = []
+        for text in texts:
+            response_body = self._invoke({**input_body, "inputText": text})
+            embeddings.append(response_body.get("embedding"))
+        return embeddings
+
+    def _invoke(self, input_body: Dict[str, Any]) -> Dict[str, Any]:
+        """Invoke the model, backing off exponentially (with jitter) while Bedrock throttles the requests."""
+        body = json.dumps(input_body)
+        attempt = 0
+        while True:
+            try:
+                # invoke bedrock API
+                response = self.client.invoke_model(
+                    body=body,
+                    modelId=self.model_id,
+                    accept="application/json",
+                    contentType="application/json",
+                )
+                return json.loads(response.get("body").read())
+            except botocore.exceptions.ClientError as e:
+                error_code = e.response["Error"]["Code"]
+                if error_code not in RETRYABLE_ERROR_CODES or attempt == self.max_retries:
+                    raise ValueError(f"Error raised by inference endpoint: {e}")  # noqa: B904
+                delay = random.uniform(0, self.backoff_base * 2**attempt)
+                logger.warning(f"Bedrock returned {error_code}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+            except Exception as e:
+                raise ValueError(f"Error raised by inference endpoint: {e}")  # noqa: B904
 
     def _normalize_vector(self, embeddings: List[float]) -> List[float]:
         """Normalize the embedding to a unit vector."""
@@ -89,6 +125,9 @@ class BedrockEmbeddings(BaseModel, Embeddings):
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Compute doc embeddings using a Bedrock model.
 
+        Up to `max_concurrency` requests are sent at a time, and Cohere models embed up to
+        `COHERE_MAX_BATCH_SIZE` texts per request. The embeddings are returned in the order of the texts.
+
         Args:
         ----
             texts: The list of texts to embed
@@ -97,18 +136,26 @@ class BedrockEmbeddings(BaseModel, Embeddings):
         -------
             List of embeddings, one for each text.
         """
-        results = []
+        if not texts:
+            return []
+
         kwargs = {}
         if self.model_provider == "cohere":
             kwargs["input_type"] = "search_document"
 
-        for text in texts:
-            response = self._embedding_func(text, **kwargs)
+        batch_size = COHERE_MAX_BATCH_SIZE if self.model_provider == "cohere" else 1
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
 
-            if self.normalize:
-                response = self._normalize_vector(response)
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            batch_results = [self._embed_batch(batch, **kwargs) for batch in batches]
+        else:
+            # map returns the results in the order of the batches, whatever order they complete in
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                batch_results = list(executor.map(lambda batch: self._embed_batch(batch, **kwargs), batches))
 
-            results.append(response)
+        results = [embedding for batch_result in batch_results for embedding in batch_result]
+        if self.normalize:
+            results = [self._normalize_vector(embedding) for embedding in results]
 
         return results
 
@@ -157,9 +204,7 @@ class BedrockEmbeddings(BaseModel, Embeddings):
         -------
             List of embeddings, one for each text.
         """
-        result = await asyncio.gather(*[self.aembed_query(text) for text in texts])
-
-        return list(result)
+        return await run_in_executor(None, self.embed_documents, texts)
 
     @property
     def model_provider(self) -> str:
@@ -0,0 +1,260 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import hashlib
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
+from langchain_core.embeddings import Embeddings
+
+if TYPE_CHECKING:
+    import sqlalchemy
+
+logger = Logger()
+
+# Number of query embeddings kept in memory per model. 0 disables the cache.
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "256"))
+
+# Optional cache shared by every Lambda function: "postgres" (a table of the vector store database) or "none"
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "none")
+# Lifetime of the entries of the shared cache, expired entries are ignored and deleted when a cache is created
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def embedding_cache_key(model_id: str, text: str) -> str:
+    """Key of a query embedding: the model and a hash of the text with its whitespace collapsed."""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.sha256(f"{model_id}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    # NumPy is imported on first use, so importers of the registry do not pay for it at cold start
+    import numpy as np
+
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    import numpy as np
+
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class EmbeddingCacheStats:
+    """Thread-safe hit and miss counters of an embedding cache."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool = False, shared_hit: bool = False) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            elif shared_hit:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.shared_hits + self.misses
+        return (self.hits + self.shared_hits) / total if total else 0.0
+
+    def drain(self) -> Dict[str, int]:
+        """Return the counters and reset them, e.g. to publish them once per invocation."""
+        with self._lock:
+            counters = {"hits": self.hits, "shared_hits": self.shared_hits, "misses": self.misses}
+            self.hits = self.shared_hits = self.misses = 0
+        return counters
+
+
+class SharedEmbeddingCache(ABC):
+    """Embedding cache shared across execution environments, storing float32 vectors as bytes."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+
+class PostgresEmbeddingCache(SharedEmbeddingCache):
+    """Stores the vectors in the `pg_embedding_cache` table of the vector store database.
+
+    Entries expire `ttl_seconds` after they were written. The expired entries are deleted when a cache is
+    created, i.e. once per execution environment, so the table only holds what was written within a TTL.
+    """
+
+    def __init__(
+        self, engine: Optional["sqlalchemy.engine.Engine"] = None, ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS
+    ) -> None:
+        import sqlalchemy
+
+        from ..database import get_engine
+
+        self._engine = engine or get_engine()
+        self._ttl = timedelta(seconds=ttl_seconds)
+        self._table = sqlalchemy.Table(
+            "pg_embedding_cache",
+            sqlalchemy.MetaData(),
+            sqlalchemy.Column("key", sqlalchemy.String, primary_key=True),
+            sqlalchemy.Column("vector", sqlalchemy.LargeBinary, nullable=False),
+            sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now()),
+        )
+        self._table.create(self._engine, checkfirst=True)
+        self.delete_expired()
+
+    def _expired(self) -> Any:
+        import sqlalchemy
+
+        return self._table.c.created_at < sqlalchemy.func.now() - self._ttl
+
+    def delete_expired(self) -> int:
+        """Delete the expired entries, returning how many were deleted."""
+        import sqlalchemy
+
+        with self._engine.begin() as connection:
+            return connection.execute(sqlalchemy.delete(self._table).where(self._expired())).rowcount
+
+    def get(self, key: str) -> Optional[bytes]:
+        import sqlalchemy
+
+        with self._engine.connect() as connection:
+            return connection.execute(
+                sqlalchemy.select(self._table.c.vector).where(self._table.c.key == key, sqlalchemy.not_(self._expired()))
+            ).scalar()
+
+    def put(self, key: str, data: bytes) -> None:
+        import sqlalchemy
+        from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(self._table).values(key=key, vector=data)
+        # An expired entry that was not deleted yet is renewed
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"], set_={"vector": stmt.excluded.vector, "created_at": sqlalchemy.func.now()}
+        )
+        with self._engine.begin() as connection:
+            connection.execute(stmt)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` client to cache query embeddings.
+
+    Query embeddings are looked up in an in-process LRU cache, then in the optional shared cache,
+    and only computed by the wrapped client on a miss. Document embeddings are not cached.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        max_entries: int = EMBEDDING_QUERY_CACHE_SIZE,
+        shared_cache: Optional[SharedEmbeddingCache] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.shared_cache = shared_cache
+        self.stats = EmbeddingCacheStats()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose the attributes of the wrapped client (model_id, client, ...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def _put_local(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(self.model_id, text)
+
+        data = self._get_local(key)
+        if data is not None:
+            self.stats.record(hit=True)
+            return decode_vector(data)
+
+        if self.shared_cache is not None:
+            try:
+                data = self.shared_cache.get(key)
+            except Exception as e:
+                logger.warning(f"Shared embedding cache lookup failed: {e}")
+            if data is not None:
+                self.stats.record(shared_hit=True)
+                self._put_local(key, data)
+                return decode_vector(data)
+
+        self.stats.record()
+        embedding = self.embeddings.embed_query(text)
+        data = encode_vector(embedding)
+        self._put_local(key, data)
+
+        if self.shared_cache is not None:
+            try:
+                self.shared_cache.put(key, data)
+            except Exception as e:
+                logger.warning(f"Failed to write to the shared embedding cache: {e}")
+
+        # Return what later hits will return, so results do not depend on the cache state
+        return decode_vector(data)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+
+def get_shared_embedding_cache() -> Optional[SharedEmbeddingCache]:
+    """Create the configured shared cache.
+
+    The shared cache is an optional layer: if it cannot be set up, e.g. because the database is unreachable
+    or the role cannot create its table, the error is logged and only the in-process cache is used.
+    """
+    if EMBEDDING_CACHE_BACKEND == "postgres":
+        try:
+            return PostgresEmbeddingCache()
+        except Exception as e:
+            logger.warning(f"Failed to set up the shared embedding cache, using the in-process cache only: {e}")
+            return None
+    elif EMBEDDING_CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Invalid embedding cache backend: {EMBEDDING_CACHE_BACKEND}")
+
+
+def add_embedding_cache_metrics(metrics: Any, caches: List[CachedEmbeddings]) -> None:
+    """Add the hits and misses of the caches since the last call to a powertools `Metrics` instance."""
+    totals = {"hits": 0, "shared_hits": 0, "misses": 0}
+    for cache in caches:
+        for name, value in cache.stats.drain().items():
+            totals[name] += value
+
+    if not any(totals.values()):
+        return
+
+    metrics.add_metric(name="EmbeddingCacheHit", unit=MetricUnit.Count, value=totals["hits"])
+    metrics.add_metric(name="EmbeddingCacheSharedHit", unit=MetricUnit.Count, value=totals["shared_hits"])
+    metrics.add_metric(name="EmbeddingCacheMiss", unit=MetricUnit.Count, value=totals["misses"])
@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from ..clients import SAGEMAKER_CLIENT_CONFIG, get_client
+from ..types import EmbeddingModel
+from .bedrock_embeddings import BedrockEmbeddings
+from .cached_embeddings import (
+    EMBEDDING_QUERY_CACHE_SIZE,
+    CachedEmbeddings,
+    SharedEmbeddingCache,
+    get_shared_embedding_cache,
+)
+from .sagemaker_embeddings import SagemakerEndpointEmbeddings
+
+
+class EmbeddingModelRegistry:
+    """Immutable set of the configured embedding models, indexed by `modelRefKey`.
+
+    The registry also keeps one `Embeddings` client per model, so requests reuse the same
+    client instead of building a new one. Unless `EMBEDDING_QUERY_CACHE_SIZE` is 0, the clients
+    cache query embeddings.
+    """
+
+    def __init__(self, models: List[EmbeddingModel]) -> None:
+        self._models: Tuple[EmbeddingModel, ...] = tuple(models)
+        self._by_ref_key = MappingProxyType({model.modelRefKey: model for model in self._models})
+        self._embeddings: Dict[EmbeddingModel, Embeddings] = {}
+        self._lock = threading.Lock()
+        self._shared_cache: Optional[SharedEmbeddingCache] = None
+        self._shared_cache_created = False
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingModelRegistry":
+        embedding_models_json = os.getenv("EMBEDDINGS_SAGEMAKER_MODELS", "[]")
+        return cls([EmbeddingModel(**model) for model in json.loads(embedding_models_json)])
+
+    @property
+    def models(self) -> Tuple[EmbeddingModel, ...]:
+        return self._models
+
+    @property
+    def default(self) -> Optional[EmbeddingModel]:
+        # The default model is always placed at the first element in the list
+        return self._models[0] if self._models else None
+
+    def get(self, model_ref_key: Optional[str] = None) -> Optional[EmbeddingModel]:
+        if not model_ref_key:
+            return self.default
+        return self._by_ref_key.get(model_ref_key)
+
+    def dimensions(self, model_ref_key: str) -> Optional[int]:
+        model = self._by_ref_key.get(model_ref_key)
+        return model.dimensions if model else None
+
+    def embeddings(self, embedding_model: EmbeddingModel) -> Embeddings:
+        embeddings = self._embeddings.get(embedding_model)
+        if embeddings is None:
+            with self._lock:
+                embeddings = self._embeddings.get(embedding_model)
+                if embeddings is None:
+                    embeddings = _create_embeddings(embedding_model)
+                    if EMBEDDING_QUERY_CACHE_SIZE > 0:
+                        embeddings = CachedEmbeddings(
+                            embeddings, embedding_model.modelId, shared_cache=self._get_shared_cache()
+                        )
+                    self._embeddings[embedding_model] = embeddings
+        return embeddings
+
+    def _get_shared_cache(self) -> Optional[SharedEmbeddingCache]:
+        if not self._shared_cache_created:
+            self._shared_cache = get_shared_embedding_cache()
+            self._shared_cache_created = True
+        return self._shared_cache
+
+    def cached_embeddings(self) -> List[CachedEmbeddings]:
+        return [embeddings for embeddings in self._embeddings.values() if isinstance(embeddings, CachedEmbeddings)]
+
+
+def _create_embeddings(embedding_model: EmbeddingModel) -> Embeddings:
+    if embedding_model.provider == "sagemaker":
+        return SagemakerEndpointEmbeddings(
+            endpoint_name=embedding_model.modelEndpointName,  # type: ignore
+            client=get_client("sagemaker-runtime", config=SAGEMAKER_CLIENT_CONFIG),
+            model_kwargs={"model": embedding_model.modelId},
+        )
+    elif embedding_model.provider == "bedrock":
+        return BedrockEmbeddings(
+            client=get_client("bedrock-runtime"),
+            model_id=embedding_model.modelId,
+        )
+    else:
+        raise ValueError(f"Invalid provider: {embedding_model.provider}")
+
+
+embedding_model_registry = EmbeddingModelRegistry.from_env()
@@ -1,8 +1,12 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
 import json
+import os
+import threading
+import time
 from abc import abstractmethod
-from typing import Any, Dict, Generic, Iterator, List, Optional, TypeVar, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar, Union
 
 from aws_lambda_powertools import Logger
 from langchain_core.embeddings import Embeddings
@@ -13,6 +17,9 @@ OUTPUT_TYPE = TypeVar("OUTPUT_TYPE", bound=Union[str, List[List[float]], Iterato
 
 logger = Logger()
 
+# Real-time endpoints reject payloads over 6 MB, keep a margin for the request envelope
+DEFAULT_MAX_PAYLOAD_BYTES = 5 * 1024 * 1024
+
 
 class ContentHandlerBase(Generic[INPUT_TYPE, OUTPUT_TYPE]):
     """Handler class to transform input from LLM to a
@@ -77,6 +84,58 @@ class SageMakerEmbeddingsContentHandler(EmbeddingsContentHandler):
         return response_json  # type: ignore
 
 
+class _BatchSizeTuner:
+    """Hands out consecutive batches of texts to concurrent workers, adapting the batch size to the
+    latency of the previous batches.
+
+    The batch size is halved when a batch takes longer than the target latency and doubled (up to
+    `max_batch_size`) when it takes less than half of it. A batch never exceeds `max_payload_bytes`.
+    """
+
+    def __init__(
+        self, texts: List[str], max_batch_size: int, target_latency: float, max_payload_bytes: int = DEFAULT_MAX_PAYLOAD_BYTES
+    ) -> None:
+        self.texts = texts
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_size = self.max_batch_size
+        self.target_latency = target_latency
+        self.max_payload_bytes = max_payload_bytes
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def next_batch(self) -> Optional[Tuple[int, List[str]]]:
+        """Return the next batch and the index of its first text, or None once all texts are handed out."""
+        with self._lock:
+            start = self._cursor
+            if start >= len(self.texts):
+                return None
+
+            end = start
+            payload_bytes = 0
+            while end < len(self.texts) and end - start < self.batch_size:
+                # Size of the text once serialized in the JSON request body
+                text_bytes = len(json.dumps(self.texts[end]).encode()) + 1
+                if end > start and payload_bytes + text_bytes > self.max_payload_bytes:
+                    break
+                payload_bytes += text_bytes
+                end += 1
+
+            self._cursor = end
+            return start, self.texts[start:end]
+
+    def stop(self) -> None:
+        """Stop handing out batches, e.g. once a batch has failed for good."""
+        with self._lock:
+            self._cursor = len(self.texts)
+
+    def record(self, batch_size: int, latency: float) -> None:
+        with self._lock:
+            if latency > self.target_latency and batch_size > 1:
+                self.batch_size = max(1, batch_size // 2)
+            elif latency < self.target_latency / 2 and batch_size >= self.batch_size:
+                self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+
+
 class SagemakerEndpointEmbeddings(BaseModel, Embeddings):
     """Custom Sagemaker Inference Endpoints.
 
@@ -126,6 +185,15 @@ class SagemakerEndpointEmbeddings(BaseModel, Embeddings):
     .. _boto3: <https://boto3.amazonaws.com/v1/documentation/api/latest/index.html>
     """
 
+    max_concurrency: int = int(os.getenv("SAGEMAKER_EMBEDDING_CONCURRENCY", "4"))
+    """Maximum number of batches sent concurrently by `embed_documents`"""
+
+    target_latency: float = 5.0
+    """Seconds a batch should take, `embed_documents` reduces the batch size when batches are slower"""
+
+    max_retries: int = 3
+    """Number of times a failed batch is split and retried before giving up"""
+
     model_config = ConfigDict(
         arbitrary_types_allowed=True, extra="forbid", protected_namespaces=()
     )
@@ -155,27 +223,72 @@ class SagemakerEndpointEmbeddings(BaseModel, Embeddings):
 
         return self.content_handler.transform_output(response["Body"])
 
+    def _embed_batch_with_retries(self, texts: List[str], attempt: int = 0) -> List[List[float]]:
+        """Embed a batch, splitting it in two on failure so that only the failed texts are sent again."""
+        try:
+            return self._embedding_func(texts)
+        except ValueError as e:
+            if attempt >= self.max_retries:
+                raise
+            logger.warning(f"Embedding a batch of {len(texts)} texts failed, retrying: {e}")
+            time.sleep(0.1 * 2**attempt)
+            if len(texts) == 1:
+                return self._embed_batch_with_retries(texts, attempt + 1)
+            middle = len(texts) // 2
+            return self._embed_batch_with_retries(texts[:middle], attempt + 1) + self._embed_batch_with_retries(
+                texts[middle:], attempt + 1
+            )
+
     def embed_documents(self, texts: List[str], chunk_size: int = 64) -> List[List[float]]:
         """Compute doc embeddings using a SageMaker Inference Endpoint.
 
+        Batches are sent by up to `max_concurrency` workers. Their size starts at `chunk_size` and
+        adapts to the latency of the endpoint and to the payload size limit.
+
         Args:
         ----
             texts: The list of texts to embed.
             chunk_size: The chunk size defines how many input texts will
-                be grouped together as request. If None, will use the
-                chunk size specified by the class.
+                be grouped together as request, at most.
 
 
         Returns:
         -------
             List of embeddings, one for each text.
         """
-        results = []
-        _chunk_size = len(texts) if chunk_size > len(texts) else chunk_size
-        for i in range(0, len(texts), _chunk_size):
-            response = self._embedding_func(texts[i : i + _chunk_size])
-            results.extend(response)
-        return results
+        if not texts:
+            return []
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        tuner = _BatchSizeTuner(texts, max_batch_size=chunk_size, target_latency=self.target_latency)
+
+        def worker() -> None:
+            while (batch := tuner.next_batch()) is not None:
+                start, batch_texts = batch
+                started_at = time.monotonic()
+                try:
+                    embeddings = self._embed_batch_with_retries(batch_texts)
+                    # The slice assignment below would shift every later embedding to the wrong text
+                    if len(embeddings) != len(batch_texts):
+                        raise ValueError(
+                            f"The inference endpoint returned {len(embeddings)} embeddings for {len(batch_texts)} texts"
+                        )
+                except Exception:
+                    tuner.stop()
+                    raise
+                tuner.record(len(batch_texts), time.monotonic() - started_at)
+                results[start : start + len(batch_texts)] = embeddings
+
+        workers = max(1, min(self.max_concurrency, -(-len(texts) // max(1, chunk_size))))
+        if workers == 1:
+            worker()
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(worker) for _ in range(workers)]:
+                    # Re-raise the errors of the workers
+                    future.result()
+
+        return results  # type: ignore
 
     def embed_query(self, text: str) -> List[float]:
         """Compute query embeddings using a SageMaker inference endpoint.
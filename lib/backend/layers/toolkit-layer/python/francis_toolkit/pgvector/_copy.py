@@ -0,0 +1,55 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Encoding of rows in the binary format of the Postgres COPY protocol."""
+import io
+import json
+import struct
+import uuid
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy as np
+
+COPY_BINARY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+Encoder = Callable[[Any], bytes]
+
+
+def encode_text(value: Any) -> bytes:
+    return str(value).encode("utf-8")
+
+
+def encode_uuid(value: Any) -> bytes:
+    return value.bytes if isinstance(value, uuid.UUID) else uuid.UUID(str(value)).bytes
+
+
+def encode_vector(value: Any) -> bytes:
+    """pgvector binary format: the dimension and an unused field as int16, then the big-endian float4 values."""
+    vector = np.asarray(value, dtype=">f4")
+    return struct.pack(">HH", vector.shape[0], 0) + vector.tobytes()
+
+
+def encode_jsonb(value: Any) -> bytes:
+    # The JSONB binary format is a version number followed by the JSON text
+    return b"\x01" + json.dumps(value).encode("utf-8")
+
+
+def copy_binary_payload(rows: Iterable[Sequence[Any]], encoders: Sequence[Encoder]) -> io.BytesIO:
+    """Encode rows for `COPY ... FROM STDIN WITH (FORMAT binary)`, with one encoder per column."""
+    buffer = io.BytesIO()
+    # Header: signature, flags and header extension length
+    buffer.write(COPY_BINARY_SIGNATURE + struct.pack(">ii", 0, 0))
+    field_count = struct.pack(">h", len(encoders))
+    null = struct.pack(">i", -1)
+    for row in rows:
+        buffer.write(field_count)
+        for value, encode in zip(row, encoders):
+            if value is None:
+                buffer.write(null)
+            else:
+                data = encode(value)
+                buffer.write(struct.pack(">i", len(data)))
+                buffer.write(data)
+    # Trailer
+    buffer.write(struct.pack(">h", -1))
+    buffer.seek(0)
+    return buffer
@@ -42,33 +42,79 @@ def cosine_similarity(X: Matrix, Y: Matrix) -> np.ndarray:
         return similarity
 
 
+def _normalize_rows(matrix: Matrix) -> np.ndarray:
+    """Scale the rows to unit norm as float32, leaving zero rows as zeros (their similarities are 0)."""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
 def maximal_marginal_relevance(
     query_embedding: np.ndarray,
-    embedding_list: list,
+    embedding_list: Matrix,
     lambda_mult: float = 0.5,
     k: int = 4,
 ) -> List[int]:
-    """Calculate maximal marginal relevance."""
-    if min(k, len(embedding_list)) <= 0:
-        return []
+    """Calculate maximal marginal relevance.
+
+    Returns the indices of the selected embeddings, in the order they were selected.
+    """
+    query_embedding = np.asarray(query_embedding)
     if query_embedding.ndim == 1:
         query_embedding = np.expand_dims(query_embedding, axis=0)
-    similarity_to_query = cosine_similarity(query_embedding, embedding_list)[0]
-    most_similar = int(np.argmax(similarity_to_query))
-    idxs = [most_similar]
-    selected = np.array([embedding_list[most_similar]])
-    while len(idxs) < min(k, len(embedding_list)):
-        best_score = -np.inf
-        idx_to_add = -1
-        similarity_to_selected = cosine_similarity(embedding_list, selected)
-        for i, query_score in enumerate(similarity_to_query):
-            if i in idxs:
-                continue
-            redundant_score = max(similarity_to_selected[i])
-            equation_score = lambda_mult * query_score - (1 - lambda_mult) * redundant_score
-            if equation_score > best_score:
-                best_score = equation_score
-                idx_to_add = i
-        idxs.append(idx_to_add)
-        selected = np.append(selected, [embedding_list[idx_to_add]], axis=0)
-    return idxs
+    return batch_maximal_marginal_relevance(query_embedding[:1], embedding_list, lambda_mult=lambda_mult, k=k)[0]
+
+
+def batch_maximal_marginal_relevance(
+    query_embeddings: Matrix,
+    embedding_list: Matrix,
+    lambda_mult: float = 0.5,
+    k: int = 4,
+) -> List[List[int]]:
+    """Calculate maximal marginal relevance for several queries over the same candidates at once.
+
+    The candidates are normalized once, and the highest similarity of each candidate to the selected
+    ones is updated with a single matrix-vector product per step, instead of being recomputed
+    against every selected candidate.
+
+    Args:
+    ----
+        query_embeddings: Matrix of the query embeddings, one row per query.
+        embedding_list: Matrix of the candidate embeddings, one row per candidate.
+        lambda_mult: Weight of the similarity to the query against the diversity of the selection.
+        k: Number of candidates to select per query.
+
+    Returns:
+    -------
+        For each query, the indices of the selected candidates in the order they were selected.
+    """
+    if len(embedding_list) == 0 or len(query_embeddings) == 0:
+        return [[] for _ in range(len(query_embeddings))]
+    candidates = _normalize_rows(embedding_list)
+    queries = _normalize_rows(query_embeddings)
+    n_queries, n_candidates = len(queries), len(candidates)
+    k = min(k, n_candidates)
+    if k <= 0:
+        return [[] for _ in range(n_queries)]
+
+    rows = np.arange(n_queries)
+    # (queries, candidates) similarities to the query, and highest similarity to the selected candidates
+    similarity_to_query = queries @ candidates.T
+    max_similarity_to_selected = np.full((n_queries, n_candidates), -np.inf, dtype=np.float32)
+    available = np.ones((n_queries, n_candidates), dtype=bool)
+    selected = np.empty((n_queries, k), dtype=np.int64)
+
+    for step in range(k):
+        if step == 0:
+            scores = similarity_to_query.copy()
+        else:
+            scores = lambda_mult * similarity_to_query - (1 - lambda_mult) * max_similarity_to_selected
+        scores[~available] = -np.inf
+        # argmax returns the first maximum, ties go to the candidate closest to the query
+        idx = np.argmax(scores, axis=1)
+        selected[:, step] = idx
+        available[rows, idx] = False
+        np.maximum(max_similarity_to_selected, candidates[idx] @ candidates.T, out=max_similarity_to_selected)
+
+    return selected.tolist()
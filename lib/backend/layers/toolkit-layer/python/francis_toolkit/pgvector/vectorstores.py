@@ -5,6 +5,8 @@ from __future__ import annotations
 
 import enum
 import logging
+import os
+import time
 import uuid
 from typing import (
     Any,
@@ -20,7 +22,7 @@ from typing import (
 
 import numpy as np
 import sqlalchemy
-from sqlalchemy import SQLColumnExpression, cast, delete, func, update
+from sqlalchemy import SQLColumnExpression, cast, delete, func, select, update
 from sqlalchemy.dialects.postgresql import JSON, JSONB, JSONPATH, UUID, insert
 from sqlalchemy.orm import Session, relationship, sessionmaker
 
@@ -35,6 +37,7 @@ from langchain_core.runnables.config import run_in_executor
 from langchain_core.utils import get_from_dict_or_env
 from langchain_core.vectorstores import VectorStore
 
+from ._copy import copy_binary_payload, encode_jsonb, encode_text, encode_uuid, encode_vector
 from ._utils import maximal_marginal_relevance
 
 
@@ -51,10 +54,39 @@ class DocumentStatus(str, enum.Enum):
 
     ACTIVE = "active"
     INACTIVE = "inactive"
+    # Written by a streaming ingestion, not searchable until the ingestion completes
+    PENDING = "pending"
+
+
+class IndexType(str, enum.Enum):
+    """Enumerator of the approximate nearest neighbor index types."""
+
+    HNSW = "hnsw"
+    IVFFLAT = "ivfflat"
+    NONE = "none"
 
 
 DEFAULT_DISTANCE_STRATEGY = DistanceStrategy.COSINE
 
+# Index built on the embeddings of each collection, and its build and search parameters
+DEFAULT_INDEX_TYPE = IndexType(os.getenv("PGVECTOR_INDEX_TYPE", IndexType.HNSW.value))
+DEFAULT_INDEX_OPTIONS: Dict[str, int] = {
+    "m": int(os.getenv("PGVECTOR_HNSW_M", "16")),
+    "ef_construction": int(os.getenv("PGVECTOR_HNSW_EF_CONSTRUCTION", "64")),
+    # 0 sizes the lists from the number of rows when the index is built
+    "lists": int(os.getenv("PGVECTOR_IVFFLAT_LISTS", "0")),
+}
+DEFAULT_SEARCH_OPTIONS: Dict[str, int] = {
+    "ef_search": int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "40")),
+    "probes": int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "10")),
+}
+
+_INDEX_OPERATOR_CLASSES = {
+    DistanceStrategy.EUCLIDEAN: "vector_l2_ops",
+    DistanceStrategy.COSINE: "vector_cosine_ops",
+    DistanceStrategy.MAX_INNER_PRODUCT: "vector_ip_ops",
+}
+
 Base = declarative_base()  # type: Any
 
 
@@ -62,6 +94,26 @@ _DEFAULT_COLLECTION_NAME = "collections"
 
 
 _classes: Any = None
+_answer_cache_class: Any = None
+
+ANSWER_CACHE_TABLE_NAME = "pg_answer_cache"
+
+# Number of rows sent per COPY or INSERT statement by `add_embeddings`
+DEFAULT_INSERT_BATCH_SIZE = int(os.getenv("PGVECTOR_INSERT_BATCH_SIZE", "1000"))
+
+# Number of inactive rows deleted per transaction by `purge_inactive`
+DEFAULT_PURGE_BATCH_SIZE = int(os.getenv("PGVECTOR_PURGE_BATCH_SIZE", "5000"))
+
+# Columns written by `add_embeddings`, with their COPY binary encoders
+_COPY_COLUMNS = (
+    ("id", encode_text),
+    ("collection_id", encode_uuid),
+    ("embedding", encode_vector),
+    ("document", encode_text),
+    ("document_source_uri", encode_text),
+    ("document_status", encode_text),
+    ("cmetadata", encode_jsonb),
+)
 
 COMPARISONS_TO_NATIVE = {
     "$eq": "==",
@@ -90,7 +142,7 @@ SUPPORTED_OPERATORS = set(COMPARISONS_TO_NATIVE).union(TEXT_OPERATORS).union(LOG
 
 
 def _get_embedding_collection_store(vector_dimension: Optional[int] = None) -> Any:
-    global _classes
+    global _classes, _answer_cache_class
     if _classes is not None:
         return _classes
 
@@ -170,11 +222,39 @@ def _get_embedding_collection_store(vector_dimension: Optional[int] = None) -> A
             ),
         )
 
+    class AnswerCacheStore(Base):
+        """Answers of previous questions, searched by question embedding."""
+
+        __tablename__ = ANSWER_CACHE_TABLE_NAME
+
+        id = sqlalchemy.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+        # Deleting a collection also drops the answers computed from it
+        collection_id = sqlalchemy.Column(
+            UUID(as_uuid=True),
+            sqlalchemy.ForeignKey(
+                f"{CollectionStore.__tablename__}.uuid",
+                ondelete="CASCADE",
+            ),
+            index=True,
+        )
+        embedding: Vector = sqlalchemy.Column(Vector(vector_dimension))
+        question = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+        answer = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+        sources = sqlalchemy.Column(JSONB, nullable=True)
+        created_at = sqlalchemy.Column(sqlalchemy.DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
     _classes = (EmbeddingStore, CollectionStore)
+    _answer_cache_class = AnswerCacheStore
 
     return _classes
 
 
+def _get_answer_cache_store(vector_dimension: Optional[int] = None) -> Any:
+    _get_embedding_collection_store(vector_dimension)
+    return _answer_cache_class
+
+
 def _results_to_docs(docs_and_scores: Any) -> List[Document]:
     """Return docs from docs and scores."""
     return [doc for doc, _ in docs_and_scores]
@@ -226,6 +306,12 @@ class PGVector(VectorStore):
         use_jsonb: bool = True,
         create_extension: bool = False,
         create_tables: bool = False,
+        insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
+        use_copy: bool = True,
+        index_dimension: Optional[int] = None,
+        index_type: IndexType = DEFAULT_INDEX_TYPE,
+        index_options: Optional[Dict[str, int]] = None,
+        search_options: Optional[Dict[str, int]] = None,
     ) -> None:
         """Initialize the PGVector store.
 
@@ -254,6 +340,15 @@ class PGVector(VectorStore):
             create_extension: If True, will create the vector extension if it
                 doesn't exist. disabling creation is useful when using ReadOnly
                 Databases.
+            insert_batch_size: Number of rows sent per statement when adding embeddings.
+            use_copy: Add embeddings with the COPY protocol when the driver supports it
+                (pg8000), instead of multi-row INSERT statements.
+            index_dimension: Dimension of the embeddings of the collection. The collection
+                is only indexed, and searched through its index, when the dimension is known.
+                (default: embedding_length)
+            index_type: Type of the approximate nearest neighbor index of the collection.
+            index_options: Build parameters of the index (`m`, `ef_construction`, `lists`).
+            search_options: Query parameters of the index (`ef_search`, `probes`).
         """
         self.embedding_function = embeddings
         self._embedding_length = embedding_length
@@ -276,6 +371,14 @@ class PGVector(VectorStore):
         self.use_jsonb = use_jsonb
         self.create_extension = create_extension
         self.create_tables = create_tables
+        self.insert_batch_size = insert_batch_size
+        self.use_copy = use_copy
+        self.index_dimension = index_dimension or embedding_length
+        self.index_type = index_type
+        self.index_options = {**DEFAULT_INDEX_OPTIONS, **(index_options or {})}
+        self.search_options = {**DEFAULT_SEARCH_OPTIONS, **(search_options or {})}
+        # UUID of the collection, cached for the similarity queries
+        self._collection_id: Optional[uuid.UUID] = None
 
         if not use_jsonb:
             # Replace with a deprecation warning.
@@ -330,6 +433,7 @@ class PGVector(VectorStore):
             self.delete_collection()
         with self._session_maker() as session:
             self.CollectionStore.get_or_create(session, self.collection_name, cmetadata=self.collection_metadata)
+        self._collection_id = None
 
     def delete_collection(self) -> None:
         self.logger.debug("Trying to delete collection")
@@ -338,8 +442,149 @@ class PGVector(VectorStore):
             if not collection:
                 self.logger.warning("Collection not found")
                 return
+            self._drop_vector_index(session, collection)
             session.delete(collection)
             session.commit()
+        self._collection_id = None
+
+    def _vector_index_name(self, collection: Any) -> str:
+        return f"ix_{self.EmbeddingStore.__tablename__}_ann_{collection.uuid.hex}"
+
+    def _drop_vector_index(self, session: Session, collection: Any) -> None:
+        # The index is partial on the collection ID, so it would outlive the collection
+        session.execute(sqlalchemy.text(f"DROP INDEX IF EXISTS {self._vector_index_name(collection)}"))
+
+    def create_vector_index(self, rebuild: bool = False) -> None:
+        """Create the approximate nearest neighbor index of the collection, if it does not exist yet.
+
+        The index is partial (it only covers the active rows of the collection, which are the only ones
+        searched) and built on the embeddings cast to the collection's dimension, as the embedding column
+        is shared by models of different dimensions.
+        It is built, and replaced on rebuilds, concurrently, so ingestion and retrieval are not blocked meanwhile.
+        IVFFlat indexes are not built on empty collections.
+
+        Args:
+        ----
+            rebuild: Build the index again, e.g. after changing its parameters or, for IVFFlat, after
+                loading a large number of rows. The current index is used until the new one is ready.
+        """
+        if self.index_type == IndexType.NONE:
+            return
+        if not self.index_dimension:
+            self.logger.warning("The embedding dimension is unknown, the collection cannot be indexed")
+            return
+
+        with self._session_maker() as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            index_name = self._vector_index_name(collection)
+            index = session.execute(
+                sqlalchemy.text(
+                    "SELECT i.indisvalid, pg_get_indexdef(i.indexrelid) AS definition "
+                    "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+                ),
+                {"name": index_name},
+            ).first()
+            valid = bool(index and index.indisvalid)
+            # Indexes created before they were restricted to active rows are rebuilt
+            rebuild = rebuild or bool(valid and "document_status" not in index.definition)  # type: ignore
+            row_count = session.execute(
+                select(func.count()).where(
+                    self.EmbeddingStore.collection_id == collection.uuid,
+                    self.EmbeddingStore.document_status == DocumentStatus.ACTIVE.value,
+                )
+            ).scalar()
+
+        if valid and not rebuild:
+            return
+        if self.index_type == IndexType.IVFFLAT and not row_count:
+            # IVFFlat lists are trained on the rows present at build time, so an index built on an empty
+            # collection would be useless. It is built by the first call after rows have been loaded.
+            self.logger.info(f"Collection {self.collection_name} has no rows yet, skipping the IVFFlat index")
+            return
+
+        table = self.EmbeddingStore.__tablename__
+        operator_class = _INDEX_OPERATOR_CLASSES[self._distance_strategy]
+        if self.index_type == IndexType.HNSW:
+            options = f"m = {int(self.index_options['m'])}, ef_construction = {int(self.index_options['ef_construction'])}"
+        else:
+            # pgvector recommends rows / 1000 lists for up to 1M rows
+            lists = int(self.index_options["lists"]) or max(1, row_count // 1000)
+            options = f"lists = {lists}"
+
+        # A new index is built next to the current one (or in place of an invalid one left by a failed build)
+        build_name = f"{index_name}_new" if valid else index_name
+        # CREATE INDEX CONCURRENTLY cannot run in a transaction
+        with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {build_name}"))
+            self.logger.info(f"Building {self.index_type.value} index {build_name} ({options})")
+            connection.execute(
+                sqlalchemy.text(
+                    f"CREATE INDEX CONCURRENTLY {build_name} ON {table} "
+                    f"USING {self.index_type.value} ((embedding::vector({int(self.index_dimension)})) {operator_class}) "
+                    f"WITH ({options}) "
+                    f"WHERE collection_id = '{collection.uuid}' AND document_status = '{DocumentStatus.ACTIVE.value}'"
+                )
+            )
+
+            if build_name != index_name:
+                # A plain DROP INDEX would lock the whole embedding table, shared by every collection, until the
+                # end of its transaction. Searches run without the index between the drop and the rename.
+                connection.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+                connection.execute(sqlalchemy.text(f"ALTER INDEX {build_name} RENAME TO {index_name}"))
+
+    def purge_inactive(self, batch_size: int = DEFAULT_PURGE_BATCH_SIZE, max_duration: Optional[float] = None) -> int:
+        """Delete the inactive rows of the collection, i.e. the chunks replaced by a later ingestion.
+
+        Rows are deleted in batches, each in its own transaction, so that locks are held briefly and
+        autovacuum can reclaim the space as the purge progresses.
+
+        Args:
+        ----
+            batch_size: Number of rows deleted per transaction.
+            max_duration: Seconds after which no new batch is started, the next purge resumes the work.
+
+        Returns:
+        -------
+            Number of rows deleted.
+        """
+        started_at = time.monotonic()
+        deleted = 0
+        with self._session_maker() as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            collection_id = collection.uuid
+
+        while max_duration is None or time.monotonic() - started_at < max_duration:
+            with self._session_maker() as session:
+                batch = (
+                    select(self.EmbeddingStore.id)
+                    .where(
+                        self.EmbeddingStore.collection_id == collection_id,
+                        self.EmbeddingStore.document_status == DocumentStatus.INACTIVE.value,
+                    )
+                    .limit(batch_size)
+                    .scalar_subquery()
+                )
+                rowcount = session.execute(delete(self.EmbeddingStore).where(self.EmbeddingStore.id.in_(batch))).rowcount
+                session.commit()
+            deleted += rowcount
+            if rowcount < batch_size:
+                break
+
+        self.logger.info(f"Purged {deleted} inactive rows from collection {self.collection_name}")
+        return deleted
+
+    def _set_search_options(self, session: Session, k: int) -> None:
+        """Set the query parameters of the index for the current transaction."""
+        if self.index_type == IndexType.HNSW:
+            # The HNSW search returns at most ef_search rows
+            ef_search = max(int(self.search_options["ef_search"]), k)
+            session.execute(sqlalchemy.text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+        elif self.index_type == IndexType.IVFFLAT:
+            session.execute(sqlalchemy.text(f"SET LOCAL ivfflat.probes = {int(self.search_options['probes'])}"))
 
     def delete(
         self,
@@ -375,6 +620,25 @@ class PGVector(VectorStore):
     def get_collection(self, session: Session) -> Any:
         return self.CollectionStore.get_by_name(session, self.collection_name)
 
+    def _get_collection_id(self, session: Session, refresh: bool = False) -> Optional[uuid.UUID]:
+        """Return the UUID of the collection, looked up once per store instance."""
+        if self._collection_id is None or refresh:
+            self._collection_id = session.execute(
+                select(self.CollectionStore.uuid).where(self.CollectionStore.name == self.collection_name)
+            ).scalar()
+        return self._collection_id
+
+    def invalidate_answer_cache(self, session: Session, collection: Any) -> None:
+        """Delete the cached answers of the collection, within the caller's transaction.
+
+        The answer cache table is created on first use of the cache, so it may not exist yet.
+        """
+        if session.execute(sqlalchemy.text(f"SELECT to_regclass('{ANSWER_CACHE_TABLE_NAME}')")).scalar() is None:
+            return
+
+        AnswerCacheStore = _get_answer_cache_store(self._embedding_length)
+        session.execute(delete(AnswerCacheStore).where(AnswerCacheStore.collection_id == collection.uuid))
+
     @classmethod
     def __from(
         cls,
@@ -418,15 +682,21 @@ class PGVector(VectorStore):
         metadatas: Optional[List[dict]] = None,
         ids: Optional[List[str]] = None,
         document_source_uri: Optional[str] = None,
+        pending: bool = False,
         **kwargs: Any,
     ) -> List[str]:
         """Add embeddings to the vectorstore.
 
+        The embeddings replace the active ones of `document_source_uri`, unless `pending` is set, in
+        which case they are added as pending and only replace them on `commit_document_replacement`.
+
         Args:
         ----
             texts: Iterable of strings to add to the vectorstore.
             embeddings: List of list of embedding vectors.
             metadatas: List of metadatas associated with the texts.
+            document_source_uri: URI of the document the texts were extracted from.
+            pending: Whether the embeddings are part of a replacement made of several batches.
             kwargs: vectorstore specific parameters
         """
         if ids is None:
@@ -440,12 +710,17 @@ class PGVector(VectorStore):
             if not collection:
                 raise ValueError("Collection not found")
 
-            if document_source_uri:
+            if document_source_uri and not pending:
                 session.execute(
                     update(self.EmbeddingStore)
-                    .where(self.EmbeddingStore.document_source_uri == document_source_uri)
+                    .where(
+                        self.EmbeddingStore.collection_id == collection.uuid,
+                        self.EmbeddingStore.document_source_uri == document_source_uri,
+                    )
                     .values(document_status=DocumentStatus.INACTIVE.value)
                 )
+                # Cached answers may quote the replaced documents, or miss the new ones
+                self.invalidate_answer_cache(session, collection)
 
             data = [
                 {
@@ -454,26 +729,114 @@ class PGVector(VectorStore):
                     "embedding": embedding,
                     "document": text,
                     "document_source_uri": document_source_uri,
-                    "document_status": DocumentStatus.ACTIVE.value,
+                    "document_status": (DocumentStatus.PENDING if pending else DocumentStatus.ACTIVE).value,
                     "cmetadata": metadata or {},
                 }
                 for text, metadata, embedding, id in zip(texts, metadatas, embeddings, ids)
             ]
-            stmt = insert(self.EmbeddingStore).values(data)
-            on_conflict_stmt = stmt.on_conflict_do_update(
-                index_elements=["id"],
-                # Conflict detection based on these columns
-                set_={
-                    "embedding": stmt.excluded.embedding,
-                    "document": stmt.excluded.document,
-                    "cmetadata": stmt.excluded.cmetadata,
-                },
-            )
-            session.execute(on_conflict_stmt)
+            if self.use_copy and self._engine.dialect.driver == "pg8000":
+                self._copy_embeddings(session, data)
+            else:
+                for i in range(0, len(data), self.insert_batch_size):
+                    stmt = insert(self.EmbeddingStore).values(data[i : i + self.insert_batch_size])
+                    on_conflict_stmt = stmt.on_conflict_do_update(
+                        index_elements=["id"],
+                        # Conflict detection based on these columns
+                        set_={
+                            "embedding": stmt.excluded.embedding,
+                            "document": stmt.excluded.document,
+                            "cmetadata": stmt.excluded.cmetadata,
+                        },
+                    )
+                    session.execute(on_conflict_stmt)
             session.commit()
 
         return ids
 
+    def _copy_embeddings(self, session: Session, data: List[Dict[str, Any]]) -> None:
+        """Upsert rows by copying them into a staging table in binary format, then merging them in a single statement.
+
+        The staging table is a temporary table of the connection, emptied when the transaction ends.
+        """
+        table = self.EmbeddingStore.__tablename__
+        staging_table = f"{table}_staging"
+        columns = ", ".join(column for column, _ in _COPY_COLUMNS)
+        encoders = [encoder for _, encoder in _COPY_COLUMNS]
+
+        session.execute(
+            sqlalchemy.text(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+        )
+
+        cursor = session.connection().connection.cursor()
+        try:
+            for i in range(0, len(data), self.insert_batch_size):
+                rows = ([row[column] for column, _ in _COPY_COLUMNS] for row in data[i : i + self.insert_batch_size])
+                cursor.execute(
+                    f"COPY {staging_table} ({columns}) FROM STDIN WITH (FORMAT binary)",
+                    stream=copy_binary_payload(rows, encoders),
+                )
+        finally:
+            cursor.close()
+
+        session.execute(
+            sqlalchemy.text(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging_table} "
+                "ON CONFLICT (id) DO UPDATE SET "
+                "embedding = EXCLUDED.embedding, document = EXCLUDED.document, cmetadata = EXCLUDED.cmetadata"
+            )
+        )
+
+    def begin_document_replacement(self, document_source_uri: str) -> None:
+        """Delete the pending embeddings left over by a failed replacement of the document in this collection.
+
+        The embedding table is shared by every collection, so the rows of the other collections, which may be
+        replacing the same document concurrently, are left alone.
+        """
+        with self._session_maker() as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+
+            session.execute(
+                delete(self.EmbeddingStore).where(
+                    self.EmbeddingStore.collection_id == collection.uuid,
+                    self.EmbeddingStore.document_source_uri == document_source_uri,
+                    self.EmbeddingStore.document_status == DocumentStatus.PENDING.value,
+                )
+            )
+            session.commit()
+
+    def commit_document_replacement(self, document_source_uri: str) -> None:
+        """Make the pending embeddings of the document active in place of the current ones, atomically."""
+        with self._session_maker() as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+
+            session.execute(
+                update(self.EmbeddingStore)
+                .where(
+                    self.EmbeddingStore.collection_id == collection.uuid,
+                    self.EmbeddingStore.document_source_uri == document_source_uri,
+                    self.EmbeddingStore.document_status == DocumentStatus.ACTIVE.value,
+                )
+                .values(document_status=DocumentStatus.INACTIVE.value)
+            )
+            session.execute(
+                update(self.EmbeddingStore)
+                .where(
+                    self.EmbeddingStore.collection_id == collection.uuid,
+                    self.EmbeddingStore.document_source_uri == document_source_uri,
+                    self.EmbeddingStore.document_status == DocumentStatus.PENDING.value,
+                )
+                .values(document_status=DocumentStatus.ACTIVE.value)
+            )
+            # Cached answers may quote the replaced documents, or miss the new ones
+            self.invalidate_answer_cache(session, collection)
+            session.commit()
+
     def add_texts(
         self,
         texts: Iterable[str],
@@ -545,14 +908,24 @@ class PGVector(VectorStore):
         docs = self.similarity_search_with_score_by_vector(embedding=embedding, k=k, threshold=threshold, filter=filter)
         return docs
 
+    @property
+    def _embedding_column(self) -> Any:
+        """The embedding column, cast to the collection's dimension so that queries match its index expression."""
+        if self.index_type == IndexType.NONE or not self.index_dimension:
+            return self.EmbeddingStore.embedding
+
+        from pgvector.sqlalchemy import Vector
+
+        return cast(self.EmbeddingStore.embedding, Vector(self.index_dimension))
+
     @property
     def distance_strategy(self) -> Any:
         if self._distance_strategy == DistanceStrategy.EUCLIDEAN:
-            return self.EmbeddingStore.embedding.l2_distance
+            return self._embedding_column.l2_distance
         elif self._distance_strategy == DistanceStrategy.COSINE:
-            return self.EmbeddingStore.embedding.cosine_distance
+            return self._embedding_column.cosine_distance
         elif self._distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
-            return self.EmbeddingStore.embedding.max_inner_product
+            return self._embedding_column.max_inner_product
         else:
             raise ValueError(
                 f"Got unexpected value for distance: {self._distance_strategy}. "
@@ -575,8 +948,8 @@ class PGVector(VectorStore):
         docs = [
             (
                 Document(
-                    page_content=result.EmbeddingStore.document,
-                    metadata=result.EmbeddingStore.cmetadata,
+                    page_content=result.document,
+                    metadata=result.cmetadata,
                 ),
                 result.distance if self.embedding_function is not None else None,
             )
@@ -824,46 +1197,69 @@ class PGVector(VectorStore):
         k: int = 4,
         threshold: Optional[float] = None,
         filter: Optional[Dict[str, str]] = None,
+        with_embeddings: bool = False,
     ) -> List[Any]:
-        """Query the collection."""
+        """Query the collection.
+
+        Returns rows of `id`, `document`, `cmetadata` and `distance`, and of `embedding` when `with_embeddings`
+        is set. The vectors are only fetched on request, as they are much larger than the rest of the row.
+        """
         with self._session_maker() as session:
-            collection = self.get_collection(session)
-            if not collection:
+            collection_id = self._get_collection_id(session)
+            if collection_id is None:
                 raise ValueError("Collection not found")
 
-            filter_by = [
-                self.EmbeddingStore.collection_id == collection.uuid,
-                self.EmbeddingStore.document_status == DocumentStatus.ACTIVE.value,
-            ]
-            if isinstance(threshold, float):
-                filter_by.append(self.distance_strategy(embedding) <= threshold)
-            if filter:
-                if self.use_jsonb:
-                    filter_clauses = self._create_filter_clause(filter)
-                    if filter_clauses is not None:
-                        filter_by.append(filter_clauses)
-                else:
-                    # Old way of doing things
-                    filter_clauses = self._create_filter_clause_json_deprecated(filter)
-                    filter_by.extend(filter_clauses)
-
-            results: List[Any] = (
-                session.query(
-                    self.EmbeddingStore,
-                    self.distance_strategy(embedding).label("distance"),
-                )
-                .filter(*filter_by)
-                .order_by(sqlalchemy.asc("distance"))
-                .join(
-                    self.CollectionStore,
-                    self.EmbeddingStore.collection_id == self.CollectionStore.uuid,
-                )
-                .limit(k)
-                .all()
-            )
+            results = self.__query_collection_by_id(session, collection_id, embedding, k, threshold, filter, with_embeddings)
+            if not results:
+                # The collection may have been deleted and recreated (purged) since its UUID was cached
+                refreshed_collection_id = self._get_collection_id(session, refresh=True)
+                if refreshed_collection_id is None:
+                    raise ValueError("Collection not found")
+                if refreshed_collection_id != collection_id:
+                    results = self.__query_collection_by_id(
+                        session, refreshed_collection_id, embedding, k, threshold, filter, with_embeddings
+                    )
 
         return results
 
+    def __query_collection_by_id(
+        self,
+        session: Session,
+        collection_id: uuid.UUID,
+        embedding: List[float],
+        k: int,
+        threshold: Optional[float],
+        filter: Optional[Dict[str, str]],
+        with_embeddings: bool,
+    ) -> List[Any]:
+        filter_by = [
+            self.EmbeddingStore.collection_id == collection_id,
+            self.EmbeddingStore.document_status == DocumentStatus.ACTIVE.value,
+        ]
+        if isinstance(threshold, float):
+            filter_by.append(self.distance_strategy(embedding) <= threshold)
+        if filter:
+            if self.use_jsonb:
+                filter_clauses = self._create_filter_clause(filter)
+                if filter_clauses is not None:
+                    filter_by.append(filter_clauses)
+            else:
+                # Old way of doing things
+                filter_clauses = self._create_filter_clause_json_deprecated(filter)
+                filter_by.extend(filter_clauses)
+
+        columns = [
+            self.EmbeddingStore.id,
+            self.EmbeddingStore.document,
+            self.EmbeddingStore.cmetadata,
+            self.distance_strategy(embedding).label("distance"),
+        ]
+        if with_embeddings:
+            columns.append(self.EmbeddingStore.embedding)
+
+        self._set_search_options(session, k)
+        return list(session.execute(select(*columns).where(*filter_by).order_by(sqlalchemy.asc("distance")).limit(k)).all())
+
     def similarity_search_by_vector(
         self,
         embedding: List[float],
@@ -1096,15 +1492,17 @@ class PGVector(VectorStore):
             List[Tuple[Document, float]]: List of Documents selected by maximal marginal
                 relevance to the query and score for each.
         """
-        results = self.__query_collection(embedding=embedding, k=fetch_k, filter=filter)
+        results = self.__query_collection(embedding=embedding, k=fetch_k, filter=filter, with_embeddings=True)
 
-        embedding_list = [result.EmbeddingStore.embedding for result in results]
+        embedding_list = [result.embedding for result in results]
 
-        mmr_selected = maximal_marginal_relevance(
-            np.array(embedding, dtype=np.float32),
-            embedding_list,
-            k=k,
-            lambda_mult=lambda_mult,
+        mmr_selected = set(
+            maximal_marginal_relevance(
+                np.array(embedding, dtype=np.float32),
+                embedding_list,
+                k=k,
+                lambda_mult=lambda_mult,
+            )
         )
 
         candidates = self._results_to_docs_and_scores(results)
@@ -3,7 +3,7 @@
 from enum import Enum
 from typing import Any, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ModelHosting(str, Enum):
@@ -18,6 +18,9 @@ class Document(BaseModel):
 
 
 class EmbeddingModel(BaseModel):
+    # Frozen so the models can be shared across requests and used as cache keys
+    model_config = ConfigDict(frozen=True)
+
     provider: str
     modelId: str
     modelRefKey: str
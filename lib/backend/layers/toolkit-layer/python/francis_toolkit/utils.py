@@ -1,94 +1,127 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
+# LangChain, SQLAlchemy, NumPy and the vector store are imported by the functions that use them rather
+# than here, so that functions which only need the helpers of this module (the websocket handler, the
+# conversation Lambda) do not pay for them at cold start.
 import decimal
 import json
 import os
+import sys
+import threading
 import time
-from typing import Any, List, Literal, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple
 
 import botocore
-from langchain_core.embeddings import Embeddings
-from langchain_core.retrievers import BaseRetriever
-from langchain_core.vectorstores import VectorStore
-
-from .clients import (
-    bedrock_agent_client,
-    bedrock_client,
-    dynamodb_resource_client,
-    lambda_client,
-    sagemaker_client,
-    secrets_manager_client,
-)
-from .embeddings.bedrock_embeddings import BedrockEmbeddings
-from .embeddings.sagemaker_embeddings import SagemakerEndpointEmbeddings
-from .pgvector.vectorstores import PGVector
-from .retrievers.knowledgebase_retriever import AmazonKnowledgeBasesRetriever, RetrievalConfig
+
+from .clients import get_client, get_resource
 from .types import EmbeddingModel
 
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.retrievers import BaseRetriever
+    from langchain_core.vectorstores import VectorStore
+
+    from .embeddings.registry import EmbeddingModelRegistry
+
+_REGISTRY_MODULE = f"{__package__}.embeddings.registry"
+
+
+def _get_embedding_model_registry() -> "EmbeddingModelRegistry":
+    from .embeddings.registry import embedding_model_registry
+
+    return embedding_model_registry
+
 
 def get_embedding_models() -> List[EmbeddingModel]:
-    # Load the embedding models from the environment variable
-    embedding_models_json = os.getenv("EMBEDDINGS_SAGEMAKER_MODELS", "[]")
-    embedding_models = [EmbeddingModel(**model) for model in json.loads(embedding_models_json)]
-    return embedding_models
+    return list(_get_embedding_model_registry().models)
 
 
 def find_embedding_model_by_ref_key(
     model_ref_key: Optional[str] = None,
 ) -> Optional[EmbeddingModel]:
-    embedding_models: List[EmbeddingModel] = get_embedding_models()
+    # Return the default model if no modelRefKey is provided
+    return _get_embedding_model_registry().get(model_ref_key)
 
-    # Return the default model if no modelRefKey is provided. Default model is always placed at the first element in the list
-    if not model_ref_key:
-        return embedding_models[0]
 
-    for model in embedding_models:
-        if model.modelRefKey == model_ref_key:
-            return model
+def get_embedding_dimensions(model_ref_key: str) -> Optional[int]:
+    return _get_embedding_model_registry().dimensions(model_ref_key)
 
-    return None
 
+def get_embeddings(embedding_model: EmbeddingModel) -> "Embeddings":
+    return _get_embedding_model_registry().embeddings(embedding_model)
 
-def get_embeddings(embedding_model: EmbeddingModel) -> Embeddings:
-    if embedding_model.provider == "sagemaker":
-        return SagemakerEndpointEmbeddings(
-            endpoint_name=embedding_model.modelEndpointName,  # type: ignore
-            client=sagemaker_client,
-            model_kwargs={"model": embedding_model.modelId},
-        )
-    elif embedding_model.provider == "bedrock":
-        return BedrockEmbeddings(
-            client=bedrock_client,
-            model_id=embedding_model.modelId,
-        )
-    else:
-        raise ValueError(f"Invalid provider: {embedding_model.provider}")
+
+def publish_embedding_cache_metrics(metrics: Any) -> None:
+    """Add the query embedding cache hits and misses since the last call to a powertools `Metrics` instance."""
+    # No embeddings client was created if the registry was never imported
+    registry_module = sys.modules.get(_REGISTRY_MODULE)
+    if registry_module is None:
+        return
+
+    from .embeddings.cached_embeddings import add_embedding_cache_metrics
+
+    add_embedding_cache_metrics(metrics, registry_module.embedding_model_registry.cached_embeddings())
 
 
-def get_vector_store(embedding_model: EmbeddingModel, **kwargs: Any) -> VectorStore:
-    embeddings = get_embeddings(embedding_model)
+_vector_stores: Dict[Tuple[str, str], "VectorStore"] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_vector_store(embedding_model: EmbeddingModel, **kwargs: Any) -> "VectorStore":
+    """Return the vector store of an embedding model's collection.
+
+    Stores created without extra arguments are kept for the lifetime of the execution environment and
+    share the process-wide engine of the RDS database, so warm invocations skip the table and collection
+    setup and reuse pooled connections.
+    """
+    from .database import get_engine, get_rds_connection_string
+    from .pgvector.vectorstores import PGVector
 
-    vector_store = PGVector(
-        embeddings=embeddings, collection_name=embedding_model.modelRefKey, connection=get_rds_connection_string(), **kwargs
-    )
+    connection_string = get_rds_connection_string()
+
+    if kwargs:
+        return PGVector(
+            embeddings=get_embeddings(embedding_model),
+            collection_name=embedding_model.modelRefKey,
+            connection=get_engine(connection_string),
+            **{"index_dimension": embedding_model.dimensions, **kwargs},
+        )
+
+    key = (connection_string, embedding_model.modelRefKey)
+    with _vector_stores_lock:
+        vector_store = _vector_stores.get(key)
+        if vector_store is None:
+            # Drop the stores bound to a connection string that is no longer current (rotated secret)
+            for stale_key in [k for k in _vector_stores if k[0] != connection_string]:
+                del _vector_stores[stale_key]
+
+            vector_store = PGVector(
+                embeddings=get_embeddings(embedding_model),
+                collection_name=embedding_model.modelRefKey,
+                connection=get_engine(connection_string),
+                index_dimension=embedding_model.dimensions,
+            )
+            _vector_stores[key] = vector_store
 
     return vector_store
 
 
-def get_retriever(modelRefKey: str, k: int = 5, score_threshold: float = 0.0) -> BaseRetriever:
-    _retriever: BaseRetriever
+def get_retriever(modelRefKey: str, k: int = 5, score_threshold: float = 0.0) -> "BaseRetriever":
+    from .config import get_system_config
 
-    system_config = load_config_from_dynamodb(os.getenv("CONFIG_TABLE_NAME", ""), "system_configuration")
+    _retriever: BaseRetriever
 
-    corpus_config = system_config["ragConfig"].get("corpusConfig")
+    corpus_config = get_system_config().corpus_config
 
     embedding_model = find_embedding_model_by_ref_key(modelRefKey)
     if not embedding_model:
         raise ValueError(f"InvalidPayload: no embedding model found for ref key {corpus_config['embeddingModelRefKey']}.")
 
     if corpus_config and corpus_config["corpusType"] == "knowledgebase":
+        from .retrievers.knowledgebase_retriever import AmazonKnowledgeBasesRetriever, RetrievalConfig
+
         _retriever = AmazonKnowledgeBasesRetriever(
-            client=bedrock_agent_client,
+            client=get_client("bedrock-agent-runtime"),
             knowledge_base_id=os.getenv("KNOWLEDGE_BASE_ID", ""),
             retrieval_config=RetrievalConfig.parse_obj({"vectorSearchConfiguration": {"numberOfResults": k}}),
             min_score_confidence=score_threshold,
@@ -102,24 +135,33 @@ def get_retriever(modelRefKey: str, k: int = 5, score_threshold: float = 0.0) ->
     return _retriever
 
 
-def get_rds_connection_string() -> str:
-    try:
-        get_secret_value_response = secrets_manager_client.get_secret_value(SecretId=os.getenv("RDS_SECRET_ARN"))
-    except botocore.exceptions.ClientError as e:
-        raise Exception(f"Error retrieving secret: {e.response['Error']['Code']}")  # noqa: B904
+def retrieve_documents(
+    modelRefKey: str, question: str, k: Optional[int] = None, score_threshold: Optional[float] = None
+) -> List[dict]:
+    """Run a similarity search against the corpus.
+
+    Args:
+    ----
+        modelRefKey (str): The reference key of the embedding model (and collection) to search.
+        question (str): The query text for the similarity search.
+        k (int, optional): The maximum number of documents to return.
+        score_threshold (float, optional): The minimum relevance score of returned documents.
+
+    Returns:
+    -------
+        List[dict]: The documents, as `pageContent` / `metadata` dicts.
+    """
+    kw_params: dict[str, Any] = {}
 
-    secret = get_secret_value_response["SecretString"]
-    secret_dict = json.loads(secret)
+    if k:
+        kw_params["k"] = int(k)
 
-    host = os.getenv("RDS_ENDPOINT")
-    port = secret_dict["port"]
-    db_name = secret_dict["dbname"]
-    username = secret_dict["username"]
-    password = secret_dict["password"]
+    if score_threshold:
+        kw_params["score_threshold"] = float(score_threshold)
 
-    connection_string = f"postgresql+pg8000://{username}:{password}@{host}:{port}/{db_name}"
+    retriever = get_retriever(modelRefKey, **kw_params)
 
-    return connection_string
+    return [{"pageContent": doc.page_content, "metadata": doc.metadata} for doc in retriever.invoke(question)]
 
 
 def get_calling_identity(cognito_authentication_provider: str) -> Tuple[str, str]:
@@ -144,7 +186,7 @@ def load_config_from_dynamodb(table_name: str, config_key: str):  # type: ignore
     -------
         dict: The configuration data as a dictionary, or None if not found.
     """
-    table = dynamodb_resource_client.Table(table_name)
+    table = get_resource("dynamodb").Table(table_name)
 
     try:
         response = table.get_item(Key={"PK": config_key})
@@ -207,7 +249,7 @@ def invoke_lambda_function(
     """
     try:
         # Invoke the Lambda function
-        response = lambda_client.invoke(
+        response = get_client("lambda").invoke(
             FunctionName=function_name,
             InvocationType=invocation_type,
             Payload=json.dumps(request_payload).encode("utf-8"),
@@ -0,0 +1,91 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Warm-up of an execution environment during the Lambda init phase.
+
+Module-level code runs before the first invocation, with the CPU boost Lambda grants to the init phase,
+so doing the one-time setup there (imports, clients, configuration, secret, first database connection)
+takes it off the latency of the first request.
+"""
+import os
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from aws_lambda_powertools import Logger
+
+from .clients import get_client, get_resource
+
+logger = Logger()
+
+# Set to false to skip the warm-up, e.g. when running the handlers locally without AWS credentials
+WARM_UP_ON_INIT = os.getenv("WARM_UP_ON_INIT", "true").lower() == "true"
+
+
+def warm_up(
+    config: bool = False,
+    database: bool = False,
+    embeddings: bool = False,
+    clients: Iterable[str] = (),
+    resources: Iterable[str] = (),
+    steps: Optional[Dict[str, Callable[[], Any]]] = None,
+) -> Dict[str, float]:
+    """Prepare what the first request would otherwise set up, returning the duration of each step in milliseconds.
+
+    A failing step is logged and skipped: the request that needs it sets it up again, and reports the error.
+
+    Args:
+    ----
+        config (bool): Load the system configuration, if `CONFIG_TABLE_NAME` is set.
+        database (bool): Read the RDS secret and open the first pooled connection, if `RDS_SECRET_ARN` is set.
+        embeddings (bool): Create the clients of the configured embedding models.
+        clients (Iterable[str]): Services of the boto3 clients to create.
+        resources (Iterable[str]): Services of the boto3 resources to create.
+        steps (Dict[str, Callable], optional): Additional steps of the function, by name.
+
+    Returns:
+    -------
+        Dict[str, float]: The duration of each step, by name.
+    """
+    durations: Dict[str, float] = {}
+    if not WARM_UP_ON_INIT:
+        return durations
+
+    def run(name: str, step: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+        durations[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    for service_name in clients:
+        run(f"client:{service_name}", partial(get_client, service_name))
+    for service_name in resources:
+        run(f"resource:{service_name}", partial(get_resource, service_name))
+
+    if config and os.getenv("CONFIG_TABLE_NAME"):
+        from .config import get_system_config
+
+        run("config", get_system_config)
+
+    if database and os.getenv("RDS_SECRET_ARN"):
+        from .database import get_engine, get_rds_connection_string
+
+        run("secret", get_rds_connection_string)
+        # The connection goes back to the pool, ready for the first request
+        run("database", lambda: get_engine().connect().close())
+
+    if embeddings:
+        from .utils import get_embedding_models, get_embeddings
+
+        def create_embeddings() -> None:
+            for embedding_model in get_embedding_models():
+                get_embeddings(embedding_model)
+
+        run("embeddings", create_embeddings)
+
+    for name, step in (steps or {}).items():
+        run(name, step)
+
+    logger.info("Warmed up the execution environment", extra={"durations": durations})
+    return durations
@@ -194,6 +194,7 @@ export class Api extends Construct {
             }),
             ...(props.rdsEndpoint && { RDS_ENDPOINT: props.rdsEndpoint }),
             ...(props.knowledgeBaseId && { KNOWLEDGE_BASE_ID: props.knowledgeBaseId }),
+            METRICS_NAMESPACE: constants.METRICS_NAMESPACE,
             /* eslint-enable @typescript-eslint/naming-convention */
         });
         corpusApiHandler.addToRolePolicy(
@@ -244,7 +245,15 @@ export class Api extends Construct {
             /* eslint-disable @typescript-eslint/naming-convention */
             CONVERSATION_LAMBDA_FUNC_NAME: conversationLambda.functionName,
             CORPUS_LAMBDA_FUNC_NAME: corpusLambda.functionName,
+            // Set to 'in_process' to query the corpus from the inference Lambda directly
+            CORPUS_RETRIEVAL_TRANSPORT: 'lambda',
+            METRICS_NAMESPACE: constants.METRICS_NAMESPACE,
             GUARDRAIL_ARN: props.baseInfra.guardrail?.attrGuardrailArn ?? '',
+            ...(props.rdsSecret && {
+                RDS_SECRET_ARN: props.rdsSecret.secretArn,
+            }),
+            ...(props.rdsEndpoint && { RDS_ENDPOINT: props.rdsEndpoint }),
+            ...(props.knowledgeBaseId && { KNOWLEDGE_BASE_ID: props.knowledgeBaseId }),
             /* eslint-enable @typescript-eslint/naming-convention */
         });
         props.baseInfra.grantBedrockTextModelAccess(inferenceLambda);
@@ -252,6 +261,22 @@ export class Api extends Construct {
         props.baseInfra.grantBedrockRerankingAccess(inferenceLambda);
         props.baseInfra.grantBedrockGuardrailAccess(inferenceLambda);
 
+        // Permissions needed by the in-process corpus retrieval transport
+        if (props.knowledgeBaseId) {
+            inferenceLambda.addToRolePolicy(
+                new iam.PolicyStatement({
+                    effect: iam.Effect.ALLOW,
+                    actions: ['bedrock:Retrieve'],
+                    resources: [
+                        `arn:aws:bedrock:${cdk.Aws.REGION}:${cdk.Aws.ACCOUNT_ID}:knowledge-base/${props.knowledgeBaseId}`,
+                    ],
+                })
+            );
+        }
+        props.rdsSecret?.grantRead(inferenceLambda);
+        props.baseInfra.grantSagemakerEmbeddingsModelAccess(inferenceLambda);
+        props.baseInfra.grantBedrockEmbeddingsModelAccess(inferenceLambda);
+
         conversationLambda.grantInvoke(inferenceLambda);
         corpusLambda.grantInvoke(inferenceLambda);
         this.addMethod(sendMessageResource, 'PUT', inferenceLambda);
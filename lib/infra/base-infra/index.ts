@@ -14,6 +14,7 @@ import * as iam from 'aws-cdk-lib/aws-iam';
 import * as wafv2 from 'aws-cdk-lib/aws-wafv2';
 import * as sagemaker from '@aws-cdk/aws-sagemaker-alpha';
 import * as cr from 'aws-cdk-lib/custom-resources';
+import * as crypto from 'crypto';
 import * as path from 'path';
 import * as ddb_util from '@aws-sdk/util-dynamodb';
 import { Construct } from 'constructs';
@@ -218,6 +219,10 @@ export class BaseInfra extends Construct {
             // eslint-disable-next-line @typescript-eslint/naming-convention
             PK: { S: 'system_configuration' },
             ...ddb_util.marshall(props.systemConfig),
+            // Lets the Lambda functions check for a new configuration without reading the whole item
+            version: {
+                S: crypto.createHash('sha256').update(JSON.stringify(props.systemConfig)).digest('hex').slice(0, 16),
+            },
         };
 
         const customResource = new cr.AwsCustomResource(
@@ -0,0 +1,139 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Report the import cost of the Lambda handlers and of the toolkit modules.
+
+Each target is imported in a fresh interpreter with `python -X importtime`. The script reports the
+median cumulative import time of each target and the top-level packages it spent that time in. Run it
+with the dependencies of the Lambda layers installed:
+
+    python scripts/benchmarks/import_time.py --repeat 5 --top 8
+    python scripts/benchmarks/import_time.py --target websocket --target francis_toolkit.utils
+
+The init warm-up is disabled (`WARM_UP_ON_INIT=false`), so only the imports are measured.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+BACKEND_DIR = os.path.join(ROOT_DIR, "lib", "backend")
+TOOLKIT_DIR = os.path.join(BACKEND_DIR, "layers", "toolkit-layer", "python")
+
+# Lambda handlers, by name: the directory of the function and its handler module
+HANDLERS: Dict[str, str] = {
+    "inference": os.path.join(BACKEND_DIR, "inference"),
+    "corpus": os.path.join(BACKEND_DIR, "corpus"),
+    "conversation": os.path.join(BACKEND_DIR, "conversation"),
+    "websocket": os.path.join(BACKEND_DIR, "websocket", "handler"),
+    "embeddings": os.path.join(BACKEND_DIR, "ingestion", "embeddings"),
+    "vector_store_management": os.path.join(BACKEND_DIR, "ingestion", "vector_store_management"),
+}
+
+TOOLKIT_MODULES = [
+    "francis_toolkit.clients",
+    "francis_toolkit.config",
+    "francis_toolkit.database",
+    "francis_toolkit.utils",
+    "francis_toolkit.embeddings.registry",
+    "francis_toolkit.pgvector.vectorstores",
+]
+
+# Written before the target is imported, to tell its imports from those of the interpreter startup
+_START_MARKER = "import-time-benchmark-start"
+
+# import time: self [us] | cumulative | imported package
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def import_once(target: str) -> Tuple[Optional[float], Dict[str, float], str]:
+    """Import a target in a fresh interpreter.
+
+    Returns:
+    -------
+        The cumulative import time of the target in milliseconds (None if the import failed), the self time
+        of each top-level package in milliseconds, and the last line of the error output of a failed import.
+    """
+    path = [TOOLKIT_DIR]
+    module = target
+    if target in HANDLERS:
+        path.insert(0, HANDLERS[target])
+        # Handlers are in `lambda.py`, which is a keyword and cannot be imported with an import statement
+        module = "lambda"
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(path),
+        "WARM_UP_ON_INIT": "false",
+        "AWS_DEFAULT_REGION": os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
+    }
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import importlib, sys; print({_START_MARKER!r}, file=sys.stderr, flush=True); importlib.import_module({module!r})",
+        ],
+        cwd=path[0],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    if completed.returncode != 0:
+        return None, {}, completed.stderr.strip().splitlines()[-1]
+
+    total = 0.0
+    packages: Dict[str, float] = defaultdict(float)
+    lines = completed.stderr.splitlines()
+    for line in lines[lines.index(_START_MARKER) + 1 :]:
+        match = _IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        # Imports at the top level are the target and its parent packages, the others are nested in them
+        if len(indent) == 1:
+            total += int(cumulative_us) / 1000
+    return total, packages, ""
+
+
+def measure(target: str, repeat: int, top: int) -> None:
+    totals: List[float] = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(repeat):
+        total, package_times, error = import_once(target)
+        if total is None:
+            print(f"{target:<40} failed: {error}")
+            return
+        totals.append(total)
+        for name, duration in package_times.items():
+            packages[name].append(duration)
+
+    medians = sorted(((statistics.median(times), name) for name, times in packages.items()), reverse=True)
+    breakdown = ", ".join(f"{name}={duration:.0f}ms" for duration, name in medians[:top])
+    print(f"{target:<40} {statistics.median(totals):8.1f}ms  {breakdown}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--target",
+        action="append",
+        help=f"Handler ({', '.join(HANDLERS)}) or toolkit module to measure, all of them by default",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per target, the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="Number of top-level packages reported per target")
+    args = parser.parse_args()
+
+    for target in args.target or [*HANDLERS, *TOOLKIT_MODULES]:
+        measure(target, args.repeat, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Compare the incremental maximal marginal relevance with the previous implementation.
+
+Both implementations select from the same random candidates, and the script checks that they
+select the same ones. It only needs NumPy:
+
+    python scripts/benchmarks/mmr.py --dimensions 1024 --k 10 --iterations 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "lib", "backend", "layers", "toolkit-layer", "python"))
+
+from francis_toolkit.pgvector._utils import (  # noqa: E402
+    batch_maximal_marginal_relevance,
+    cosine_similarity,
+    maximal_marginal_relevance,
+)
+
+FETCH_K_VALUES = [20, 200, 2000]
+
+
+def previous_maximal_marginal_relevance(
+    query_embedding: np.ndarray, embedding_list: list, lambda_mult: float = 0.5, k: int = 4
+) -> List[int]:
+    """The implementation replaced by the incremental one, kept as a reference."""
+    if min(k, len(embedding_list)) <= 0:
+        return []
+    if query_embedding.ndim == 1:
+        query_embedding = np.expand_dims(query_embedding, axis=0)
+    similarity_to_query = cosine_similarity(query_embedding, embedding_list)[0]
+    most_similar = int(np.argmax(similarity_to_query))
+    idxs = [most_similar]
+    selected = np.array([embedding_list[most_similar]])
+    while len(idxs) < min(k, len(embedding_list)):
+        best_score = -np.inf
+        idx_to_add = -1
+        similarity_to_selected = cosine_similarity(embedding_list, selected)
+        for i, query_score in enumerate(similarity_to_query):
+            if i in idxs:
+                continue
+            redundant_score = max(similarity_to_selected[i])
+            equation_score = lambda_mult * query_score - (1 - lambda_mult) * redundant_score
+            if equation_score > best_score:
+                best_score = equation_score
+                idx_to_add = i
+        idxs.append(idx_to_add)
+        selected = np.append(selected, [embedding_list[idx_to_add]], axis=0)
+    return idxs
+
+
+def measure(select: Callable[[], object], iterations: int) -> float:
+    select()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        select()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=8, help="Number of queries of the batched selection")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for fetch_k in FETCH_K_VALUES:
+        candidates = rng.standard_normal((fetch_k, args.dimensions)).astype(np.float32)
+        queries = rng.standard_normal((args.queries, args.dimensions)).astype(np.float32)
+        # pgvector returns one array per row
+        embedding_list = list(candidates)
+
+        previous = previous_maximal_marginal_relevance(queries[0], embedding_list, args.lambda_mult, args.k)
+        current = maximal_marginal_relevance(queries[0], embedding_list, args.lambda_mult, args.k)
+        if previous != current:
+            print(f"fetch_k={fetch_k}: selections differ, previous={previous} current={current}")
+
+        previous_ms = measure(
+            lambda: previous_maximal_marginal_relevance(queries[0], embedding_list, args.lambda_mult, args.k), args.iterations
+        )
+        current_ms = measure(
+            lambda: maximal_marginal_relevance(queries[0], embedding_list, args.lambda_mult, args.k), args.iterations
+        )
+        batch_ms = measure(
+            lambda: batch_maximal_marginal_relevance(queries, candidates, args.lambda_mult, args.k), args.iterations
+        )
+        print(
+            f"fetch_k={fetch_k:<5} previous={previous_ms:9.2f}ms incremental={current_ms:8.2f}ms "
+            f"speedup={previous_ms / current_ms:6.1f}x batch({args.queries} queries)={batch_ms:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""Compare the latency of the Lambda and in-process corpus retrieval transports.
+
+Run it from an environment that can reach the deployed corpus Lambda and vector store (for
+example a Cloud9 instance in the solution VPC), with the same environment variables the
+inference Lambda uses:
+
+    CORPUS_LAMBDA_FUNC_NAME=... CONFIG_TABLE_NAME=... EMBEDDINGS_SAGEMAKER_MODELS='[...]' \\
+    RDS_SECRET_ARN=... RDS_ENDPOINT=... \\
+    python scripts/benchmarks/retrieval_transport.py --question "What is ...?" --iterations 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "lib", "backend", "layers", "toolkit-layer", "python"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "lib", "backend", "inference"))
+
+from common.retrieval import InProcessRetrievalTransport, LambdaRetrievalTransport, RetrievalTransport  # noqa: E402
+from francis_toolkit.utils import find_embedding_model_by_ref_key  # noqa: E402
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(name: str, search: Callable[[], list], iterations: int) -> None:
+    # The first call pays for cold clients, connections and (for Lambda) a possible cold start
+    started = time.perf_counter()
+    documents = search()
+    first_ms = (time.perf_counter() - started) * 1000
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        search()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    payload_bytes = len(json.dumps(documents).encode("utf-8"))
+    print(
+        f"{name:<12} first={first_ms:8.1f}ms mean={statistics.mean(samples):8.1f}ms "
+        f"p50={percentile(samples, 50):8.1f}ms p95={percentile(samples, 95):8.1f}ms "
+        f"docs={len(documents)} payload={payload_bytes}B"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--question", required=True)
+    parser.add_argument("--model-ref-key", default=None, help="Defaults to the first configured embedding model")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    embedding_model = find_embedding_model_by_ref_key(args.model_ref_key)
+    if embedding_model is None:
+        raise SystemExit(f"No embedding model found for ref key {args.model_ref_key}")
+
+    transports: List[tuple[str, RetrievalTransport]] = [
+        ("lambda", LambdaRetrievalTransport()),
+        ("in_process", InProcessRetrievalTransport()),
+    ]
+    for name, transport in transports:
+        run(
+            name,
+            lambda transport=transport: transport.search(  # type: ignore[misc]
+                question=args.question, model_ref_key=embedding_model.modelRefKey, corpus_limit=args.limit
+            ),
+            args.iterations,
+        )
+
+
+if __name__ == "__main__":
+    main()